@@ -1,6 +1,13 @@
 import csv
+import glob
+import heapq
 import itertools
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 
 PROBS = {
 
@@ -36,16 +43,61 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Largest number of people exact inference may have to consider together
+MAX_CLIQUE = 14
+
+# Number of assignments scored at once by the vectorized enumeration
+BLOCK_SIZE = 1 << 16
+
+# Settings for sampling-based inference
+CHAINS = 4
+SAMPLES = 1000
+ROUNDS = 10
+BURN_IN = 100
+
+# Columns of the results written by batch mode
+BATCH_FIELDS = [
+    "family", "person", "gene_0", "gene_1", "gene_2", "trait",
+    "method", "people", "seconds"
+]
+
+
+class PedigreeTooLoopy(ValueError):
+    """Raised when exact inference would need cliques larger than `MAX_CLIQUE`."""
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python heredity.py data.csv, or python heredity.py families output.csv")
+
+    # Solves every family in a directory or glob pattern and writes one CSV of results
+    if len(sys.argv) == 3:
+        batch(sys.argv[1], sys.argv[2])
+        return
+
     people = load_data(sys.argv[1])
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    # Compute gene and trait probabilities for each person
+    probabilities, _ = solve(people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def empty_probabilities(people):
+    """
+    Return a dictionary to keep track of gene and trait probabilities
+    for each person in `people`, with every probability set to 0.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -60,6 +112,15 @@ def main():
         for person in people
     }
 
+
+def enumerate_probabilities(people):
+    """
+    Return the normalized gene and trait probabilities for each person in
+    `people` by summing the joint probability of every possible assignment
+    of genes and traits. This takes O(2^n * 3^n) time for n people.
+    """
+    probabilities = empty_probabilities(people)
+
     # Loop over all sets of people who might have the trait
     names = set(people)
     for have_trait in powerset(names):
@@ -84,14 +145,7 @@ def main():
     # Ensure probabilities sum to 1
     normalize(probabilities)
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return probabilities
 
 
 def load_data(filename):
@@ -128,6 +182,102 @@ def powerset(s):
     ]
 
 
+def submasks(mask):
+    """
+    Lazily yield every subset of the people in bitmask `mask`, as bitmasks.
+    """
+    subset = mask
+    while True:
+        yield subset
+        if subset == 0:
+            return
+        subset = (subset - 1) & mask
+
+
+def pruned_probabilities(people):
+    """
+    Return the normalized gene and trait probabilities for each person in
+    `people` by enumerating every assignment, like `enumerate_probabilities`,
+    but with sets of people represented as bitmasks generated lazily.
+
+    Only traits consistent with the known traits are generated, and the
+    probability of everyone's genes is computed once per gene assignment
+    and reused for all of its trait assignments.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    everyone = (1 << len(names)) - 1
+
+    # Stores the people known to have the trait and those whose trait is unknown
+    have_trait = 0
+    unknown = 0
+    for i, name in enumerate(names):
+        if people[name]["trait"] is None:
+            unknown |= 1 << i
+        elif people[name]["trait"]:
+            have_trait |= 1 << i
+
+    parents = [
+        (index[people[name]["mother"]], index[people[name]["father"]])
+        if people[name]["mother"] is not None else None
+        for name in names
+    ]
+
+    gene_totals = [[0, 0, 0] for _ in names]
+    trait_totals = [[0, 0] for _ in names]
+
+    for one_gene in submasks(everyone):
+        for two_genes in submasks(everyone & ~one_gene):
+            genes = [
+                1 if one_gene >> i & 1 else 2 if two_genes >> i & 1 else 0
+                for i in range(len(names))
+            ]
+
+            # Multiplies the probability of everyone having the number of genes they do
+            p_genes = 1
+            for i, gene in enumerate(genes):
+                if parents[i] is None:
+                    p_genes *= PROBS["gene"][gene]
+                else:
+                    pmom = inheritance(genes[parents[i][0]])
+                    pdad = inheritance(genes[parents[i][1]])
+                    if gene == 2:
+                        p_genes *= pmom * pdad
+                    elif gene == 1:
+                        p_genes *= (pmom * (1 - pdad)) + (pdad * (1 - pmom))
+                    else:
+                        p_genes *= (1 - pdad) * (1 - pmom)
+
+            # Stores the probability of each person not having and having the trait given their genes
+            p_traits = [
+                (PROBS["trait"][gene][False], PROBS["trait"][gene][True])
+                for gene in genes
+            ]
+
+            # Loops only over the sets of people consistent with the known traits
+            for traits in submasks(unknown):
+                traits |= have_trait
+                p = p_genes
+                for i in range(len(names)):
+                    p *= p_traits[i][traits >> i & 1]
+
+                for i, gene in enumerate(genes):
+                    gene_totals[i][gene] += p
+                    trait_totals[i][traits >> i & 1] += p
+
+    probabilities = empty_probabilities(people)
+    for i, person in enumerate(names):
+        for gene in range(3):
+            probabilities[person]["gene"][gene] = gene_totals[i][gene]
+        probabilities[person]["trait"][True] = trait_totals[i][1]
+        probabilities[person]["trait"][False] = trait_totals[i][0]
+
+    # Ensure probabilities sum to 1
+    normalize(probabilities)
+
+    return probabilities
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
@@ -242,5 +392,734 @@ def normalize(probabilities):
 
         
 
+def encode_people(people):
+    """
+    Return the pedigree in `people` as NumPy arrays, in a tuple
+    (names, mothers, fathers, known, traits).
+
+    `mothers` and `fathers` hold the index in `names` of each person's
+    parents, or -1 if they have none. `known` marks the people whose trait
+    is known, and `traits` holds the known traits as 0 or 1.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    mothers = np.array([index.get(people[name]["mother"], -1) for name in names], dtype=np.int64)
+    fathers = np.array([index.get(people[name]["father"], -1) for name in names], dtype=np.int64)
+    known = np.array([people[name]["trait"] is not None for name in names])
+    traits = np.array([bool(people[name]["trait"]) for name in names], dtype=np.int64)
+
+    return names, mothers, fathers, known, traits
+
+
+def log_tables():
+    """
+    Return the logarithms of the probabilities in `PROBS` as NumPy arrays,
+    in a tuple (prior, child, trait), indexed by [gene],
+    [gene, mother's gene, father's gene] and [gene, trait] respectively.
+    """
+    child = child_table()
+    prior = np.array([PROBS["gene"][gene] for gene in range(3)])
+    trait = np.array([
+        [PROBS["trait"][gene][False], PROBS["trait"][gene][True]]
+        for gene in range(3)
+    ])
+
+    with np.errstate(divide="ignore"):
+        return np.log(prior), np.log(child), np.log(trait)
+
+
+def joint_log_probabilities(mothers, fathers, genes, traits, tables=None):
+    """
+    Return the logarithm of the joint probability of every row of the
+    arrays `genes` and `traits`, where row b assigns genes[b, i] copies of
+    the gene and trait traits[b, i] to person i. `mothers` and `fathers`
+    are as returned by `encode_people`, and `tables` by `log_tables`.
+    """
+    prior, child, trait = tables or log_tables()
+
+    # Uses unconditional probabilites for people with no parents
+    founders = mothers < 0
+    children = ~founders
+    log_p = prior[genes[:, founders]].sum(axis=1)
+
+    # Uses conditional probabilites derived from the parents for everyone else
+    log_p += child[
+        genes[:, children],
+        genes[:, mothers[children]],
+        genes[:, fathers[children]]
+    ].sum(axis=1)
+
+    log_p += trait[genes, traits].sum(axis=1)
+    return log_p
+
+
+def vectorized_probabilities(people, block_size=BLOCK_SIZE):
+    """
+    Return the normalized gene and trait probabilities for each person in
+    `people` by enumerating every assignment, like `enumerate_probabilities`,
+    but scoring `block_size` assignments at a time with NumPy.
+
+    Only the traits of people whose trait is unknown are enumerated, so
+    assignments that contradict the evidence are never generated.
+    """
+    names, mothers, fathers, known, observed = encode_people(people)
+    tables = log_tables()
+    n = len(names)
+    unknown = np.flatnonzero(~known)
+    rows = np.arange(n)
+
+    # Encodes each assignment as one integer, with a base 3 digit for every
+    # person's genes followed by a bit for every unknown trait
+    gene_places = 3 ** np.arange(n, dtype=np.int64)
+    trait_places = np.arange(len(unknown), dtype=np.int64)
+    total = 3 ** n * 2 ** len(unknown)
+
+    gene_totals = np.zeros((n, 3))
+    trait_totals = np.zeros((n, 2))
+    for start in range(0, total, block_size):
+        codes = np.arange(start, min(start + block_size, total), dtype=np.int64)
+        genes = codes[:, None] // gene_places % 3
+        traits = np.broadcast_to(observed, genes.shape).copy()
+        traits[:, unknown] = (codes[:, None] // 3 ** n) >> trait_places & 1
+
+        p = np.exp(joint_log_probabilities(mothers, fathers, genes, traits, tables))
+
+        # Adds each joint probability to the distributions of every person
+        weights = np.broadcast_to(p[:, None], genes.shape)
+        np.add.at(gene_totals, (np.broadcast_to(rows, genes.shape), genes), weights)
+        np.add.at(trait_totals, (np.broadcast_to(rows, traits.shape), traits), weights)
+
+    gene_totals /= gene_totals.sum(axis=1, keepdims=True)
+    trait_totals /= trait_totals.sum(axis=1, keepdims=True)
+
+    probabilities = empty_probabilities(people)
+    for i, person in enumerate(names):
+        for gene in range(3):
+            probabilities[person]["gene"][gene] = float(gene_totals[i, gene])
+        probabilities[person]["trait"][True] = float(trait_totals[i, 1])
+        probabilities[person]["trait"][False] = float(trait_totals[i, 0])
+
+    return probabilities
+
+
+def inheritance(gene):
+    """
+    Return the probability that a parent with `gene` copies of the gene
+    passes the gene on to their child.
+    """
+    if gene == 2:
+        return 1 - PROBS["mutation"]
+    if gene == 1:
+        return 0.5
+    return PROBS["mutation"]
+
+
+def child_table():
+    """
+    Return a NumPy array of the probability of a child's genes given the
+    genes of their mother and father, indexed by [child, mother, father].
+    """
+    passes = np.array([inheritance(gene) for gene in range(3)])
+    mother, father = np.meshgrid(passes, passes, indexing="ij")
+    return np.stack([
+        (1 - mother) * (1 - father),
+        mother * (1 - father) + father * (1 - mother),
+        mother * father
+    ])
+
+
+def person_factors(people):
+    """
+    Return a list of factors, one per person in `people`, whose product
+    is the joint probability of everyone's genes and known traits.
+
+    A factor is a tuple (names, table), where `table` is a NumPy array
+    with one axis of length 3 (for 0, 1 or 2 copies of the gene) per
+    person in `names`.
+    """
+    # Stores the probability of a known trait for each number of genes
+    trait = {
+        value: np.array([PROBS["trait"][gene][value] for gene in range(3)])
+        for value in (True, False)
+    }
+    child = child_table()
+
+    factors = []
+    for person in people:
+
+        # Uses unconditional probabilites for people with no parents
+        if people[person]["mother"] is None:
+            names = (person,)
+            table = np.array([PROBS["gene"][gene] for gene in range(3)])
+        else:
+            names = (person, people[person]["mother"], people[person]["father"])
+            table = child.copy()
+
+        # Includes the probability of the person's trait if it is known
+        if people[person]["trait"] is not None:
+            table = table * trait[people[person]["trait"]].reshape((3,) + (1,) * (len(names) - 1))
+
+        factors.append((names, table))
+
+    return factors
+
+
+def align(factor, names):
+    """
+    Return the table of `factor` with its axes arranged in the order of
+    `names`, so it broadcasts against any table over `names`.
+    """
+    variables, table = factor
+    order = [variables.index(name) for name in names if name in variables]
+    shape = [3 if name in variables else 1 for name in names]
+    return table.transpose(order).reshape(shape)
+
+
+def marginalize(factor, names):
+    """
+    Return `factor` with every person not in `names` summed out,
+    normalized so the table sums to 1.
+    """
+    variables, table = factor
+    axes = tuple(i for i, name in enumerate(variables) if name not in names)
+    table = table.sum(axis=axes)
+    return tuple(name for name in variables if name in names), table / table.sum()
+
+
+def elimination_order(factors):
+    """
+    Return the order in which to eliminate people, choosing the person
+    with the fewest neighbors (people sharing a factor with them) first,
+    along with a dictionary mapping each person to the set of neighbors
+    they had when eliminated.
+    """
+    # Connects every pair of people who appear in the same factor
+    neighbors = dict()
+    for names, _ in factors:
+        for name in names:
+            neighbors.setdefault(name, set()).update(names)
+    for name in neighbors:
+        neighbors[name].discard(name)
+
+    heap = [(len(neighbors[name]), name) for name in neighbors]
+    heapq.heapify(heap)
+
+    order = []
+    cliques = dict()
+    while heap:
+        degree, name = heapq.heappop(heap)
+
+        # Skips stale entries left behind when a person's degree changed
+        if name in cliques or degree != len(neighbors[name]):
+            continue
+
+        # Eliminating a person connects all of their remaining neighbors
+        order.append(name)
+        cliques[name] = neighbors[name]
+        for neighbor in neighbors[name]:
+            neighbors[neighbor].discard(name)
+            neighbors[neighbor].update(neighbors[name] - {neighbor})
+            heapq.heappush(heap, (len(neighbors[neighbor]), neighbor))
+
+    return order, cliques
+
+
+def infer(people):
+    """
+    Return the normalized gene and trait probabilities for each person in
+    `people`, computed exactly with a junction tree.
+
+    The pedigree is compiled into one factor per person, and eliminating
+    people one at a time in `elimination_order` yields a tree of cliques.
+    Passing messages up and then down this tree gives every person's
+    marginal in time linear in the number of people for tree-like pedigrees.
+    Raise `PedigreeTooLoopy` if the pedigree has too many loops for that.
+    """
+    factors = person_factors(people)
+    order, separators = elimination_order(factors)
+    position = {name: i for i, name in enumerate(order)}
+
+    # Refuses pedigrees with so many loops that the tables would not fit in memory
+    largest = max((len(separators[name]) + 1 for name in order), default=0)
+    if largest > MAX_CLIQUE:
+        raise PedigreeTooLoopy(
+            f"Pedigree needs cliques of {largest} people, "
+            f"more than the {MAX_CLIQUE} exact inference allows"
+        )
+
+    # Makes one clique per eliminated person, whose parent is the clique of
+    # the first person eliminated among their neighbors
+    scopes = [(name,) + tuple(sorted(separators[name], key=position.get)) for name in order]
+    parents = [position[scope[1]] if len(scope) > 1 else None for scope in scopes]
+
+    # Multiplies every factor into the clique of its first eliminated person
+    potentials = [np.ones((3,) * len(scope)) for scope in scopes]
+    for names, table in factors:
+        i = min(position[name] for name in names)
+        potentials[i] = potentials[i] * align((names, table), scopes[i])
+
+    # Passes messages up the tree, each clique summing out its own person
+    up = [None] * len(scopes)
+    incoming = [potential.copy() for potential in potentials]
+    for i, scope in enumerate(scopes):
+        if parents[i] is None:
+            continue
+        up[i] = marginalize((scope, incoming[i]), scope[1:])
+        parent = parents[i]
+        incoming[parent] = incoming[parent] * align(up[i], scopes[parent])
+
+    # Passes messages back down the tree, so every clique holds its full belief
+    beliefs = incoming
+    for i in reversed(range(len(scopes))):
+        if parents[i] is None:
+            continue
+        parent = parents[i]
+
+        # Removes the clique's own message from its parent's belief
+        names, message = marginalize((scopes[parent], beliefs[parent]), scopes[i][1:])
+        message = np.divide(
+            message, align(up[i], names),
+            out=np.zeros_like(message), where=align(up[i], names) > 0
+        )
+        beliefs[i] = beliefs[i] * align((names, message), scopes[i])
+
+    probabilities = empty_probabilities(people)
+    for person in people:
+        _, genes = marginalize((scopes[position[person]], beliefs[position[person]]), (person,))
+        for gene in range(3):
+            probabilities[person]["gene"][gene] = float(genes[gene])
+
+        # Uses the known trait, otherwise sums the probability of the trait over the number of genes
+        if people[person]["trait"] is not None:
+            probabilities[person]["trait"][True] = float(people[person]["trait"])
+        else:
+            probabilities[person]["trait"][True] = float(sum(
+                genes[gene] * PROBS["trait"][gene][True] for gene in range(3)
+            ))
+        probabilities[person]["trait"][False] = 1 - probabilities[person]["trait"][True]
+
+    return probabilities
+
+
+def compile_model(people):
+    """
+    Return the pedigree in `people` as a dictionary of plain lists used
+    by the samplers, so it can be sent cheaply to worker processes.
+
+    People are referred to by their index in "names". "parents" holds each
+    person's (mother, father) or None, "children" the people they are a
+    parent of, "likelihood" the probability of their known trait for each
+    number of genes, and "order" lists everyone with parents first.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+
+    parents = [
+        (index[people[name]["mother"]], index[people[name]["father"]])
+        if people[name]["mother"] is not None else None
+        for name in names
+    ]
+    children = [[] for _ in names]
+    for i, pair in enumerate(parents):
+        for parent in set(pair or ()):
+            children[parent].append(i)
+
+    likelihood = [
+        [1.0] * 3 if people[name]["trait"] is None else
+        [PROBS["trait"][gene][people[name]["trait"]] for gene in range(3)]
+        for name in names
+    ]
+
+    # Orders people so that everyone comes after their parents
+    order = []
+    placed = [False] * len(names)
+    for start in range(len(names)):
+        stack = [start]
+        while stack:
+            i = stack[-1]
+            if placed[i]:
+                stack.pop()
+                continue
+            waiting = [parent for parent in set(parents[i] or ()) if not placed[parent]]
+            if waiting:
+                stack.extend(waiting)
+            else:
+                placed[i] = True
+                order.append(i)
+                stack.pop()
+
+    return {
+        "names": names,
+        "parents": parents,
+        "children": children,
+        "likelihood": likelihood,
+        "known": [people[name]["trait"] for name in names],
+        "order": order
+    }
+
+
+def gibbs_segment(model, genes, rng, sweeps, burn_in=0):
+    """
+    Run `sweeps` sweeps of Gibbs sampling over everyone's genes in `model`
+    (see `compile_model`), after `burn_in` unrecorded sweeps, starting from
+    the list `genes` and drawing from the NumPy generator `rng`.
+
+    Return a tuple (genes, rng, stats) with the state to continue from.
+    `stats` holds the summed conditional probabilities of each number of
+    genes ("gene") and of the trait ("trait") for each person, and the sums
+    of each person's expected number of genes ("x") and its square ("xx").
+    """
+    parents = model["parents"]
+    children = model["children"]
+    likelihood = model["likelihood"]
+    child = child_table().tolist()
+    prior = [PROBS["gene"][gene] for gene in range(3)]
+    trait = [PROBS["trait"][gene][True] for gene in range(3)]
+    n = len(genes)
+
+    stats = {
+        "sweeps": sweeps,
+        "gene": [[0.0, 0.0, 0.0] for _ in range(n)],
+        "trait": [0.0] * n,
+        "x": [0.0] * n,
+        "xx": [0.0] * n
+    }
+
+    for sweep in range(burn_in + sweeps):
+        record = sweep >= burn_in
+        uniforms = rng.random(n).tolist()
+        for i in range(n):
+
+            # Finds the probability of each number of genes given everyone else's genes
+            weights = []
+            for gene in range(3):
+                if parents[i] is None:
+                    w = prior[gene]
+                else:
+                    w = child[gene][genes[parents[i][0]]][genes[parents[i][1]]]
+                for c in children[i]:
+                    mother, father = parents[c]
+                    w *= child[genes[c]][gene if mother == i else genes[mother]][gene if father == i else genes[father]]
+                weights.append(w * likelihood[i][gene])
+            total = weights[0] + weights[1] + weights[2]
+            p = [w / total for w in weights]
+
+            # Samples the person's new number of genes
+            u = uniforms[i]
+            genes[i] = 0 if u < p[0] else 1 if u < p[0] + p[1] else 2
+
+            # Records the conditional probabilities rather than the sample, which lowers variance
+            if record:
+                row = stats["gene"][i]
+                row[0] += p[0]
+                row[1] += p[1]
+                row[2] += p[2]
+                stats["trait"][i] += p[0] * trait[0] + p[1] * trait[1] + p[2] * trait[2]
+                x = p[1] + 2 * p[2]
+                stats["x"][i] += x
+                stats["xx"][i] += x * x
+
+    return genes, rng, stats
+
+
+def weighting_segment(model, rng, particles):
+    """
+    Draw `particles` samples of everyone's genes in `model` (see
+    `compile_model`) from the gene model alone, weighting each by the
+    probability of the known traits, using the NumPy generator `rng`.
+
+    Return a tuple (rng, stats), where `stats` holds the weighted sums
+    described in `gibbs_segment`, the sum of the weights ("w") and of their
+    squares ("ww"), all scaled by exp(-"shift") to avoid underflow.
+    """
+    n = len(model["names"])
+    child = child_table()
+    prior = np.array([PROBS["gene"][gene] for gene in range(3)])
+    trait = np.array([PROBS["trait"][gene][True] for gene in range(3)])
+    with np.errstate(divide="ignore"):
+        log_likelihood = np.log(np.array(model["likelihood"]))
+
+    genes = np.zeros((particles, n), dtype=np.int64)
+    log_weights = np.zeros(particles)
+    for i in model["order"]:
+
+        # Samples the person's genes from their parents' genes, or unconditionally if they have none
+        if model["parents"][i] is None:
+            p = np.broadcast_to(prior, (particles, 3))
+        else:
+            mother, father = model["parents"][i]
+            p = child[:, genes[:, mother], genes[:, father]].T
+        u = rng.random(particles)[:, None]
+        genes[:, i] = np.minimum((u > p.cumsum(axis=1)).sum(axis=1), 2)
+
+        log_weights += log_likelihood[i][genes[:, i]]
+
+    shift = log_weights.max()
+    weights = np.exp(log_weights - shift)
+
+    onehot = np.zeros((particles, n, 3))
+    np.put_along_axis(onehot, genes[:, :, None], 1, axis=2)
+    x = genes.astype(float)
+
+    stats = {
+        "sweeps": particles,
+        "shift": float(shift),
+        "w": float(weights.sum()),
+        "ww": float((weights ** 2).sum()),
+        "gene": np.einsum("p,pnk->nk", weights, onehot).tolist(),
+        "trait": (weights @ trait[genes]).tolist(),
+        "x": (weights @ x).tolist(),
+        "xx": (weights @ x ** 2).tolist()
+    }
+
+    return rng, stats
+
+
+def run_segment(task):
+    """
+    Run one segment of a sampling chain described by the dictionary
+    `task`, for use by worker processes. Return the updated task along
+    with the segment's stats.
+    """
+    if task["method"] == "gibbs":
+        task["genes"], task["rng"], stats = gibbs_segment(
+            task["model"], task["genes"], task["rng"], task["sweeps"], task["burn_in"]
+        )
+        task["burn_in"] = 0
+    else:
+        task["rng"], stats = weighting_segment(task["model"], task["rng"], task["sweeps"])
+
+    return task, stats
+
+
+def merge_stats(total, stats):
+    """
+    Return the sum of two sets of sampling stats, rescaling weighted
+    stats to a common shift if needed.
+    """
+    if total is None:
+        return stats
+
+    a, b = 1.0, 1.0
+    merged = {"sweeps": total["sweeps"] + stats["sweeps"]}
+    if "shift" in stats:
+        merged["shift"] = max(total["shift"], stats["shift"])
+        a = np.exp(total["shift"] - merged["shift"])
+        b = np.exp(stats["shift"] - merged["shift"])
+        merged["w"] = a * total["w"] + b * stats["w"]
+        merged["ww"] = a * a * total["ww"] + b * b * stats["ww"]
+
+    for key in ("gene", "trait", "x", "xx"):
+        merged[key] = (a * np.array(total[key]) + b * np.array(stats[key])).tolist()
+
+    return merged
+
+
+def diagnose(chains, means, weighted):
+    """
+    Return a dictionary of convergence diagnostics for each person's
+    expected number of genes, given the merged stats of every chain in
+    `chains` and the per-segment means of every chain in `means`.
+
+    "ess" is the effective sample size. For Gibbs sampling it is estimated
+    from the variance of segment means (batch means), and "rhat" is the
+    Gelman-Rubin statistic across chains. For likelihood weighting "ess"
+    is (sum of weights)^2 / sum of squared weights and "rhat" is None.
+    """
+    if weighted:
+
+        # Rescales every chain to the largest shift, as weights far below 1 would underflow
+        shift = max(chain["shift"] for chain in chains)
+        w = np.array([chain["w"] * np.exp(chain["shift"] - shift) for chain in chains])
+        ww = np.array([chain["ww"] * np.exp(2 * (chain["shift"] - shift)) for chain in chains])
+        ess = float(w.sum() ** 2 / ww.sum()) if ww.sum() > 0 else 0.0
+        return {"ess": ess, "rhat": None}
+
+    draws = np.array([chain["sweeps"] for chain in chains], dtype=float)[:, None]
+    mean = np.array([chain["x"] for chain in chains]) / draws
+    variance = np.maximum(np.array([chain["xx"] for chain in chains]) / draws - mean ** 2, 0)
+
+    # Compares the variance within chains to the variance between them
+    within = variance.mean(axis=0)
+    n = draws.mean()
+    between = mean.var(axis=0, ddof=1) if len(chains) > 1 else np.zeros_like(within)
+    pooled = (n - 1) / n * within + between
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rhat = np.where(within > 0, np.sqrt(pooled / within), 1.0)
+
+    # Estimates the autocorrelation from how much segment means vary
+    means = np.array(means).reshape(-1, mean.shape[1])
+    segment = draws.sum() / len(means)
+    if len(means) > 1:
+        batch = segment * means.var(axis=0, ddof=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ess = np.where(batch > 0, draws.sum() * within / batch, draws.sum())
+        ess = np.minimum(ess, draws.sum())
+    else:
+        ess = np.full(mean.shape[1], draws.sum())
+
+    return {"ess": ess.tolist(), "rhat": rhat.tolist()}
+
+
+def sample_probabilities(people, method="gibbs", chains=CHAINS, samples=SAMPLES,
+                         rounds=ROUNDS, burn_in=BURN_IN, seed=None, workers=None):
+    """
+    Estimate the gene and trait probabilities for each person in `people`
+    by sampling, with `method` either "gibbs" (Gibbs sampling) or
+    "weighting" (likelihood weighting).
+
+    Run `chains` independent chains in a pool of `workers` processes, each
+    taking `samples` samples split over `rounds` rounds. After every round
+    yield a tuple (probabilities, diagnostics) with the current estimates
+    (see `diagnose`), so the caller can stop as soon as they are good
+    enough. The same `seed` always gives the same estimates.
+    """
+    if method not in ("gibbs", "weighting"):
+        raise ValueError(f"Unknown sampling method {method!r}")
+
+    model = compile_model(people)
+    n = len(model["names"])
+    child = child_table()
+    streams = np.random.SeedSequence(seed).spawn(chains)
+
+    # Starts every chain from genes sampled ignoring the traits
+    tasks = []
+    for stream in streams:
+        rng = np.random.default_rng(stream)
+        genes = [0] * n
+        for i in model["order"]:
+            if model["parents"][i] is None:
+                p = [PROBS["gene"][gene] for gene in range(3)]
+            else:
+                mother, father = model["parents"][i]
+                p = child[:, genes[mother], genes[father]]
+            genes[i] = int(rng.choice(3, p=p))
+        tasks.append({
+            "method": method,
+            "model": model,
+            "genes": genes,
+            "rng": rng,
+            "sweeps": max(1, samples // rounds),
+            "burn_in": burn_in
+        })
+
+    totals = [None] * chains
+    means = [[] for _ in range(chains)]
+    with ProcessPoolExecutor(workers) as executor:
+        for _ in range(rounds):
+            results = list(executor.map(run_segment, tasks))
+            tasks = [task for task, _ in results]
+            for c, (_, stats) in enumerate(results):
+                totals[c] = merge_stats(totals[c], stats)
+                scale = stats["w"] if method == "weighting" else stats["sweeps"]
+                means[c].append(np.array(stats["x"]) / scale if scale > 0 else np.zeros(n))
+
+            combined = None
+            for total in totals:
+                combined = merge_stats(combined, total)
+            yield (
+                estimate(people, model, combined),
+                diagnose(totals, means, method == "weighting")
+            )
+
+
+def estimate(people, model, stats):
+    """
+    Return the gene and trait probabilities for each person in `people`
+    from merged sampling `stats`, normalized to sum to 1.
+    """
+    probabilities = empty_probabilities(people)
+    for i, person in enumerate(model["names"]):
+        for gene in range(3):
+            probabilities[person]["gene"][gene] = stats["gene"][i][gene]
+
+        # Uses the known trait, otherwise the sampled probability of the trait
+        total = sum(stats["gene"][i])
+        if model["known"][i] is not None:
+            probabilities[person]["trait"][True] = float(model["known"][i])
+            probabilities[person]["trait"][False] = 1 - float(model["known"][i])
+        else:
+            probabilities[person]["trait"][True] = stats["trait"][i]
+            probabilities[person]["trait"][False] = total - stats["trait"][i]
+
+    normalize(probabilities)
+    return probabilities
+
+
+def approximate(people, **options):
+    """
+    Return a tuple (probabilities, diagnostics) with the final estimates
+    of `sample_probabilities(people, **options)`.
+    """
+    result = None
+    for result in sample_probabilities(people, **options):
+        pass
+    return result
+
+
+def solve(people):
+    """
+    Return a tuple (probabilities, method) with the gene and trait
+    probabilities for each person in `people`, computed exactly if
+    possible and by sampling if the pedigree has too many loops.
+    """
+    try:
+        return infer(people), "exact"
+    except PedigreeTooLoopy as error:
+        print(f"{error}, sampling instead", file=sys.stderr)
+        probabilities, _ = approximate(people, workers=1)
+        return probabilities, "gibbs"
+
+
+def solve_family(filename):
+    """
+    Load and solve the family in `filename`, returning a list of result
+    rows, one per person, in the columns of `BATCH_FIELDS`.
+    """
+    start = time.perf_counter()
+    people = load_data(filename)
+    probabilities, method = solve(people)
+    seconds = time.perf_counter() - start
+
+    return [
+        [
+            filename, person,
+            probabilities[person]["gene"][0],
+            probabilities[person]["gene"][1],
+            probabilities[person]["gene"][2],
+            probabilities[person]["trait"][True],
+            method, len(people), seconds
+        ]
+        for person in people
+    ]
+
+
+def batch(pattern, output, workers=None):
+    """
+    Solve every family CSV matching `pattern`, which is either a directory
+    or a glob pattern, in a pool of `workers` processes, and write the
+    results of all families to the CSV file `output`.
+
+    Families are started largest file first, so a big family is not left
+    running alone at the end. Rows are written as each family finishes. A
+    family that fails is reported and given a single row with the method
+    "error", and the other families are still solved.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    filenames = sorted(glob.glob(pattern), key=os.path.getsize, reverse=True)
+
+    with open(output, "w", newline="") as f, ProcessPoolExecutor(workers) as executor:
+        writer = csv.writer(f)
+        writer.writerow(BATCH_FIELDS)
+        futures = {executor.submit(solve_family, filename): filename for filename in filenames}
+        for future in as_completed(futures):
+            try:
+                writer.writerows(future.result())
+            except Exception as error:
+                print(f"{futures[future]}: {error!r}", file=sys.stderr)
+                writer.writerow([futures[future], "", "", "", "", "", "error", "", ""])
+
+
 if __name__ == "__main__":
     main()
@@ -2,23 +2,70 @@ import os
 import random
 import re
 import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 10000
+SURFERS = 1000
+CHUNK_SIZE = 1 << 20
+MAX_TAG_LENGTH = 4096
+TOLERANCE = 0.001
+MAX_ITERATIONS = 1000
+EXTRAPOLATION_PERIOD = 10
+WALKS = 100
+
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+
+    # Reads the solver used by iteration from an optional --solver=NAME flag
+    method = "power"
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--solver="):
+            method = arg[len("--solver="):]
+        else:
+            args.append(arg)
+    if len(args) not in [1, 2] or method not in SOLVERS:
+        sys.exit(f"Usage: python pagerank.py [--solver={'|'.join(SOLVERS)}] corpus [graph]")
+
+    # Crawls large corpora in parallel to disk and ranks the memory-mapped graph
+    if len(args) == 2:
+        crawl_to_disk(args[0], args[1])
+        pages, offsets, targets = load_graph(args[1])
+        ranks = sample_graph(offsets, targets, DAMPING, SAMPLES)
+        print(f"PageRank Results from Sampling (n = {SAMPLES})")
+        for page, rank in sorted(zip(pages, ranks)):
+            print(f"  {page}: {rank:.4f}")
+        iterated, _ = solve_graph(offsets, targets, DAMPING, method)
+        print(f"PageRank Results from Iteration ({method})")
+        for page, rank in sorted(zip(pages, iterated)):
+            print(f"  {page}: {rank:.4f}")
+        print(f"Sampling Error (L1): {np.abs(ranks - iterated).sum():.4f}")
+        print(f"PageRank Solvers (tolerance = {TOLERANCE})")
+        for report in compare_solvers(offsets, targets, DAMPING):
+            print(
+                f"  {report['method']}: {report['iterations']} iterations, "
+                f"{report['time']:.4f}s, error {report['error']:.6f}"
+            )
+        return
+
+    corpus = crawl(args[0])
+    sampled = vectorized_sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    for page in sorted(sampled):
+        print(f"  {page}: {sampled[page]:.4f}")
+    ranks = iterate_pagerank(corpus, DAMPING, method)
+    print(f"PageRank Results from Iteration ({method})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
+    print(f"Sampling Error (L1): {convergence_error(sampled, ranks):.4f}")
 
 
 def crawl(directory):
@@ -33,10 +80,8 @@ def crawl(directory):
     for filename in os.listdir(directory):
         if not filename.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+        links = parse_links(os.path.join(directory, filename))
+        pages[filename] = links - {filename}
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -48,6 +93,96 @@ def crawl(directory):
     return pages
 
 
+def parse_links(path):
+    """
+    Return the set of all links in the HTML file at `path`.
+    The file is read in chunks of `CHUNK_SIZE` characters, so large files
+    are never loaded into memory all at once. Links in tags longer than
+    `MAX_TAG_LENGTH` characters may be missed where a chunk ends.
+    """
+    links = set()
+
+    # Stores the end of the previous chunk in case a link was cut in half
+    tail = ""
+
+    with open(path) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer = tail + chunk
+
+            # Finds all the complete links in the buffer
+            end = 0
+            for match in LINK.finditer(buffer):
+                links.add(match.group(1))
+                end = match.end()
+
+            # Keeps any tag that may still be incomplete for the next chunk,
+            # unless it has grown too long to be a tag, such as after a stray "<"
+            start = buffer.rfind("<")
+            if start >= end and len(buffer) - start <= MAX_TAG_LENGTH:
+                tail = buffer[start:]
+            else:
+                tail = ""
+
+    return links
+
+
+def crawl_to_disk(directory, output, workers=None):
+    """
+    Parse a directory of HTML pages using a pool of `workers` processes
+    and write the link graph to the directory `output`.
+
+    Page names are written to `pages.txt`, one per line, and each page is
+    referred to by its line number. The links are written in the form
+    returned by `index_corpus`, as `offsets.npy` and `targets.npy`, which
+    `load_graph` memory-maps.
+    """
+    # Gives every page in the corpus an integer id
+    pages = sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.name.endswith(".html")
+    )
+    ids = {page: i for i, page in enumerate(pages)}
+
+    # Stores the links of all pages as one flat list of ids
+    offsets = array("q", [0])
+    targets = array("q")
+
+    paths = [os.path.join(directory, page) for page in pages]
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(paths) // (4 * workers))
+    with ProcessPoolExecutor(workers) as executor:
+        for i, links in enumerate(executor.map(parse_links, paths, chunksize=chunksize)):
+
+            # Only includes links to other pages in the corpus
+            targets.extend(sorted(
+                ids[link] for link in links
+                if link in ids and ids[link] != i
+            ))
+            offsets.append(len(targets))
+
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, "pages.txt"), "w") as f:
+        f.writelines(page + "\n" for page in pages)
+    np.save(os.path.join(output, "offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+    np.save(os.path.join(output, "targets.npy"), np.frombuffer(targets, dtype=np.int64))
+
+
+def load_graph(directory):
+    """
+    Return the link graph written by `crawl_to_disk` to `directory` as a
+    tuple (pages, offsets, targets), with the arrays memory-mapped read-only.
+    """
+    with open(os.path.join(directory, "pages.txt")) as f:
+        pages = f.read().splitlines()
+    offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+    targets = np.load(os.path.join(directory, "targets.npy"), mmap_mode="r")
+
+    return pages, offsets, targets
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -126,74 +261,680 @@ def sample_pagerank(corpus, damping_factor, n):
     return pagerank
 
 
-def iterate_pagerank(corpus, damping_factor):
+def index_corpus(corpus):
+    """
+    Return a compact array form of `corpus` as a tuple (pages, offsets, targets).
+
+    `pages` is a sorted list of page names. The pages linked to by the page
+    at index i are `targets[offsets[i]:offsets[i + 1]]`, given as indices
+    into `pages`.
+    """
+    # Gives every page an integer index so links can be stored as arrays
+    pages = sorted(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+
+    # Stores where the links of each page start and end in the targets array
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum([len(corpus[page]) for page in pages], out=offsets[1:])
+
+    # Flattens the links of every page into one array of page indices
+    targets = np.fromiter(
+        (index[link] for page in pages for link in sorted(corpus[page])),
+        dtype=np.int64, count=int(offsets[-1])
+    )
+
+    return pages, offsets, targets
+
+
+def sample_graph(offsets, targets, damping_factor, n, surfers=SURFERS, seed=None):
+    """
+    Return a NumPy array of PageRank values for the graph given by
+    `offsets` and `targets` (see `index_corpus`) by sampling `n` pages.
+
+    The samples are taken by `surfers` independent random surfers which
+    move in parallel, each starting on a page chosen at random. Passing
+    the same `seed` gives the same result.
+    """
+    rng = np.random.default_rng(seed)
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+    surfers = max(1, min(surfers, n))
+
+    # Keeps count of the number of times each page was visited
+    counts = np.zeros(total, dtype=np.int64)
+
+    # Places every surfer on a page chosen at random
+    current = rng.integers(total, size=surfers)
+
+    remaining = n
+    while True:
+
+        # Records the pages the surfers are on as samples, only keeping as many as still needed
+        taken = min(remaining, surfers)
+        counts += np.bincount(current[:taken], minlength=total)
+        remaining -= taken
+        if remaining == 0:
+            break
+
+        # Decides which surfers follow a link, pages with no links are treated as linking to every page
+        follow = (rng.random(surfers) < damping_factor) & (degrees[current] > 0)
+
+        # Picks a random link for each surfer following one and a random page for all the others
+        link = offsets[current] + (rng.random(surfers) * degrees[current]).astype(np.int64)
+        current = rng.integers(total, size=surfers)
+        current[follow] = targets[link[follow]]
+
+    return counts / n
+
+
+def vectorized_sample_pagerank(corpus, damping_factor, n, surfers=SURFERS, seed=None):
+    """
+    Return PageRank values for each page by sampling `n` pages with
+    `surfers` random surfers moving in parallel (see `sample_graph`).
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    pages, offsets, targets = index_corpus(corpus)
+    ranks = sample_graph(offsets, targets, damping_factor, n, surfers, seed)
+    return {page: float(rank) for page, rank in zip(pages, ranks)}
+
+
+def convergence_error(ranks, reference):
+    """
+    Return the L1 distance between two dictionaries of PageRank values,
+    e.g. sampled ranks and the ranks found by iteration.
+    """
+    return SUM(abs(ranks[page] - reference[page]) for page in reference)
+
+
+def iterate_pagerank(corpus, damping_factor, method="power"):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until convergence, using the solver named `method`
+    (see `solve_graph`).
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    # Creates and populates a dict to keep track of all the page ranks
-    pagerank = {}
-    for key in corpus:
-        pagerank[key] =  1/len(corpus)
+    pages, offsets, targets = index_corpus(corpus)
+    ranks, _ = solve_graph(offsets, targets, damping_factor, method)
+    return {page: float(rank) for page, rank in zip(pages, ranks)}
 
-    # Causes a repition of pagerank calculation until the degree of 0.001 accuracy is met
-    while True:
 
-        # Creates a copy of the current pagerank dict to calculate the degree of accuracy later
-        copy = pagerank.copy()
+def propagate(ranks, offsets, targets, damping_factor):
+    """
+    Return the PageRank values that follow from `ranks` after one
+    application of the PageRank formula to the graph given by `offsets`
+    and `targets`. Pages with no links are treated as linking to every page.
+    """
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+    sources = np.repeat(np.arange(total), degrees)
 
-        for page in corpus:
-            
-            # Creates a list which will be used to help calculate the sum of PR(i)/ NumLinks(i)
-            info = []
+    # Sums PR(i) / NumLinks(i) over all the pages i that link to each page
+    share = ranks / np.maximum(degrees, 1)
+    linked = np.bincount(targets, weights=share[sources], minlength=total)
 
-            # Iterates over all other pages except the current one
-            for key in pagerank:
+    # Spreads the rank of pages without links evenly over all pages
+    linked += ranks[degrees == 0].sum() / total
 
-                # Ensures the current page is excluded from the calculation as well as ensure the current page is linked to by included pages
-                if key != page and page in corpus[key]:
+    return (1 - damping_factor) / total + damping_factor * linked
 
-                    # Assumes a page with no links has links to every page
-                    if len(corpus[key]) == 0:
-                        info.append((pagerank[key], len(corpus)))
 
-                    # Scenario for any other pages with their own links
-                    else:
-                        info.append((pagerank[key], len(corpus[key])))
+def iterate_graph(offsets, targets, damping_factor, ranks=None,
+                  tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return a NumPy array of PageRank values for the graph given by
+    `offsets` and `targets` by iteratively updating PageRank values,
+    starting from `ranks` (or the uniform distribution if None), until
+    they change by less than `tolerance` in total.
+    """
+    return solve_graph(
+        offsets, targets, damping_factor, "power",
+        ranks, tolerance, max_iterations
+    )[0]
 
-            # Calculates the PR(i)/NumLinks(i)
-            for i in range(len(info)):
-                info[i] = info[i][0] / info[i][1]
 
-            # Sums all the PR(i)/NumLinks(i) together
-            sum = SUM(info)
+def solve_graph(offsets, targets, damping_factor, method="power", ranks=None,
+                tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return a tuple (ranks, report) of PageRank values for the graph given
+    by `offsets` and `targets`, found by the solver named `method` (a key
+    of `SOLVERS`) starting from `ranks`, or the uniform distribution if None.
+
+    Iteration stops once the PageRank values change by less than
+    `tolerance` in total, or after `max_iterations` iterations. `report`
+    is a dictionary with the solver's "method", its number of
+    "iterations", the L1 "residuals" of every iteration and the "time"
+    taken in seconds.
+    """
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown solver {method!r}")
+
+    total = len(offsets) - 1
+    if ranks is None:
+        ranks = np.full(total, 1 / total)
+    else:
+        ranks = np.array(ranks, dtype=float)
+
+    start = time.perf_counter()
+    ranks, residuals = SOLVERS[method](
+        offsets, targets, damping_factor, ranks, tolerance, max_iterations
+    )
+    report = {
+        "method": method,
+        "iterations": len(residuals),
+        "residuals": residuals,
+        "time": time.perf_counter() - start
+    }
+
+    return ranks, report
+
+
+def power_iteration(offsets, targets, damping_factor, ranks, tolerance, max_iterations):
+    """
+    Return a tuple (ranks, residuals) by applying the PageRank formula to
+    every page at once until the ranks converge.
+    """
+    residuals = []
+    for _ in range(max_iterations):
+        new = propagate(ranks, offsets, targets, damping_factor)
+        residuals.append(float(np.abs(new - ranks).sum()))
+        ranks = new
+        if residuals[-1] < tolerance:
+            break
 
+    return ranks, residuals
 
-            # Calculates the current page's new page rank
-            copy[page] = ((1 - damping_factor) / len(corpus)) + (damping_factor * sum)
 
-        for page in corpus:
+def gauss_seidel(offsets, targets, damping_factor, ranks, tolerance, max_iterations):
+    """
+    Return a tuple (ranks, residuals) by applying the PageRank formula to
+    one page at a time, each using the ranks already updated in the same
+    sweep. This needs fewer sweeps than power iteration, but every sweep
+    is a Python loop over all links.
+    """
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+    sources = np.repeat(np.arange(total), degrees)
+
+    # Groups the links by the page they link to
+    targets = np.asarray(targets)
+    order = np.argsort(targets, kind="stable")
+    incoming = sources[order].tolist()
+    starts = np.searchsorted(targets[order], np.arange(total + 1)).tolist()
+
+    weights = (1 / np.maximum(degrees, 1)).tolist()
+    dangling = (degrees == 0).tolist()
+    ranks = ranks.tolist()
+    base = (1 - damping_factor) / total
+
+    # Keeps track of the total rank of pages without links
+    lost = SUM(rank for rank, empty in zip(ranks, dangling) if empty)
+
+    residuals = []
+    for _ in range(max_iterations):
+        change = 0.0
+        for page in range(total):
+            linked = 0.0
+            for source in incoming[starts[page]:starts[page + 1]]:
+                linked += ranks[source] * weights[source]
+            new = base + damping_factor * (linked + lost / total)
+
+            change += abs(new - ranks[page])
+            if dangling[page]:
+                lost += new - ranks[page]
+            ranks[page] = new
+
+        # Rescales the ranks to sum to 1, since a sweep does not keep the total
+        scale = 1 / SUM(ranks)
+        ranks = [rank * scale for rank in ranks]
+        lost *= scale
+
+        residuals.append(change)
+        if change < tolerance:
+            break
+
+    ranks = np.array(ranks)
+    return ranks / ranks.sum(), residuals
+
+
+def aitken(history):
+    """
+    Return an estimate of the limit of the last three PageRank vectors in
+    `history`, using Aitken's delta-squared process on each page.
+    """
+    x0, x1, x2 = history[-3:]
+    denominator = x2 - 2 * x1 + x0
+    safe = np.abs(denominator) > 1e-15
 
-            # Creates a variable which allows return of the pagerank dictionary when accuracy of 0.001 is met
-            flag = True
+    limit = x2.copy()
+    limit[safe] = x2[safe] - (x2[safe] - x1[safe]) ** 2 / denominator[safe]
+    return limit
 
-            # Checks the difference between the current and old pangeranks to check the degree of accuracy
-            if abs(pagerank[page] - copy[page]) > 0.001:
-                flag = False
-                
-                # Updates the previous pagerank to be the same as the new one
-                pagerank = copy
-                break
 
-        # Ends the infinite loop if a 0.001 degree of accuracy is reached
-        if flag:
-            return pagerank
+def quadratic(history):
+    """
+    Return an estimate of the limit of the last four PageRank vectors in
+    `history`, using quadratic extrapolation (Kamvar et al., 2003).
+    """
+    x0, x1, x2, x3 = history[-4:]
+    y = np.column_stack([x1 - x0, x2 - x0])
+    gamma1, gamma2 = -np.linalg.lstsq(y, x3 - x0, rcond=None)[0]
+
+    return (gamma1 + gamma2 + 1) * x1 + (gamma2 + 1) * x2 + x3
 
 
+def extrapolated_iteration(offsets, targets, damping_factor, ranks, tolerance,
+                           max_iterations, extrapolate, needed):
+    """
+    Return a tuple (ranks, residuals) by power iteration, replacing the
+    ranks every `EXTRAPOLATION_PERIOD` iterations with `extrapolate` of
+    the last `needed` iterates.
+    """
+    history = [ranks]
+    residuals = []
+    for i in range(1, max_iterations + 1):
+        new = propagate(ranks, offsets, targets, damping_factor)
+        residuals.append(float(np.abs(new - ranks).sum()))
+        ranks = new
+        if residuals[-1] < tolerance:
+            break
+
+        history = history[-(needed - 1):] + [ranks]
+        if i % EXTRAPOLATION_PERIOD == 0 and len(history) == needed:
+
+            # Falls back to the plain iterate for any page the estimate makes non-positive
+            limit = extrapolate(history)
+            limit = np.where(limit > 0, limit, ranks)
+            ranks = limit / limit.sum()
+            history = [ranks]
+
+    return ranks, residuals
+
+
+def aitken_extrapolation(offsets, targets, damping_factor, ranks, tolerance, max_iterations):
+    """
+    Return a tuple (ranks, residuals) by power iteration with periodic
+    Aitken extrapolation.
+    """
+    return extrapolated_iteration(
+        offsets, targets, damping_factor, ranks, tolerance, max_iterations, aitken, 3
+    )
+
+
+def quadratic_extrapolation(offsets, targets, damping_factor, ranks, tolerance, max_iterations):
+    """
+    Return a tuple (ranks, residuals) by power iteration with periodic
+    quadratic extrapolation.
+    """
+    return extrapolated_iteration(
+        offsets, targets, damping_factor, ranks, tolerance, max_iterations, quadratic, 4
+    )
+
+
+def adaptive_iteration(offsets, targets, damping_factor, ranks, tolerance, max_iterations):
+    """
+    Return a tuple (ranks, residuals) by power iteration that stops
+    updating pages once their rank changes by less than `tolerance / N`
+    in an iteration (Kamvar et al., 2003). Links into such pages are
+    dropped from later iterations.
+    """
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+    dangling = degrees == 0
+    sources = np.repeat(np.arange(total), degrees)
+    targets = np.asarray(targets)
+
+    # Stores the pages still being updated and the links into them
+    active = np.ones(total, dtype=bool)
+    active_sources, active_targets = sources, targets
+    threshold = tolerance / total
+
+    residuals = []
+    for _ in range(max_iterations):
+        share = ranks / np.maximum(degrees, 1)
+        linked = np.bincount(active_targets, weights=share[active_sources], minlength=total)
+        linked += ranks[dangling].sum() / total
+
+        new = ranks.copy()
+        new[active] = (1 - damping_factor) / total + damping_factor * linked[active]
+        change = np.abs(new - ranks)
+        residuals.append(float(change.sum()))
+        ranks = new
+        if residuals[-1] < tolerance:
+            break
+
+        # Freezes the pages which have converged
+        converged = active & (change < threshold)
+        if converged.any():
+            active &= ~converged
+            keep = active[targets]
+            active_sources, active_targets = sources[keep], targets[keep]
+
+    return ranks / ranks.sum(), residuals
+
+
+SOLVERS = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "aitken": aitken_extrapolation,
+    "quadratic": quadratic_extrapolation,
+    "adaptive": adaptive_iteration
+}
+
+
+def compare_solvers(offsets, targets, damping_factor, tolerance=TOLERANCE):
+    """
+    Run every solver in `SOLVERS` on the graph given by `offsets` and
+    `targets`, and return a list of their reports (see `solve_graph`),
+    each with the L1 "error" against a tightly converged reference.
+    """
+    reference = iterate_graph(offsets, targets, damping_factor, tolerance=1e-12)
+
+    reports = []
+    for method in SOLVERS:
+        ranks, report = solve_graph(offsets, targets, damping_factor, method, tolerance=tolerance)
+        report["error"] = float(np.abs(ranks - reference).sum())
+        reports.append(report)
+
+    return reports
+
+
+def push_graph(offsets, targets, damping_factor, ranks, tolerance=TOLERANCE):
+    """
+    Return a NumPy array of PageRank values for the graph given by
+    `offsets` and `targets`, correcting the close estimate `ranks` by
+    pushing residuals along links only from the pages whose rank is off.
+    The total error is kept below roughly `tolerance`.
+    """
+    total = len(offsets) - 1
+    degrees = np.diff(offsets).tolist()
+    starts = offsets[:-1].tolist()
+    links = np.asarray(targets).tolist()
+
+    # Finds how far each page is from satisfying the PageRank formula
+    ranks = np.array(ranks, dtype=float)
+    residual = (propagate(ranks, offsets, targets, damping_factor) - ranks).tolist()
+    ranks = ranks.tolist()
+
+    # Stores the residual every page is owed by pages with no links
+    uniform = 0.0
+
+    threshold = tolerance * (1 - damping_factor) / total
+    queued = [abs(r) > threshold for r in residual]
+    queue = deque(i for i in range(total) if queued[i])
+
+    while queue:
+        while queue:
+            page = queue.popleft()
+            queued[page] = False
+
+            # Moves the residual of the page into its rank
+            r = residual[page]
+            ranks[page] += r
+            residual[page] = 0.0
+
+            # Pages with no links pass the residual on to every page
+            if degrees[page] == 0:
+                uniform += damping_factor * r / total
+                continue
+
+            # Passes the residual on to every page linked to by the page
+            share = damping_factor * r / degrees[page]
+            for link in links[starts[page]:starts[page] + degrees[page]]:
+                residual[link] += share
+                if not queued[link] and abs(residual[link]) > threshold:
+                    queued[link] = True
+                    queue.append(link)
+
+        # Hands the residual from pages with no links to every page once it becomes significant
+        if abs(uniform) > threshold:
+            for page in range(total):
+                residual[page] += uniform
+                if abs(residual[page]) > threshold:
+                    queued[page] = True
+                    queue.append(page)
+            uniform = 0.0
+
+    ranks = np.array(ranks)
+    return ranks / ranks.sum()
+
+
+def update_corpus(corpus, added=None, removed=None):
+    """
+    Return a copy of `corpus` with links changed.
+
+    `added` maps pages to sets of links added to them, and may include new
+    pages. `removed` maps pages to sets of links removed from them, or to
+    None if the page itself is removed. Links to pages not in the resulting
+    corpus are dropped.
+    """
+    added = added or dict()
+    removed = removed or dict()
+
+    pages = {
+        page: set(links) for page, links in corpus.items()
+        if page not in removed or removed[page] is not None
+    }
+    for page, links in added.items():
+        pages.setdefault(page, set()).update(links)
+    for page, links in removed.items():
+        if links is not None and page in pages:
+            pages[page] -= links
+
+    # Only includes links to other pages in the corpus
+    for page in pages:
+        pages[page] = set(
+            link for link in pages[page]
+            if link in pages and link != page
+        )
+
+    return pages
+
+
+def update_pagerank(corpus, ranks, damping_factor, added=None, removed=None,
+                    push=False, tolerance=TOLERANCE):
+    """
+    Return a tuple (corpus, ranks) for `corpus` changed by `added` and
+    `removed` (see `update_corpus`), where `ranks` are the PageRank values
+    of the unchanged corpus.
+
+    The new PageRank values start from the old ones, with new pages
+    starting at 1 / N. If `push` is True the correction is only spread
+    from the pages affected by the change (see `push_graph`); otherwise
+    iteration is resumed over the whole corpus.
+    """
+    corpus = update_corpus(corpus, added, removed)
+    pages, offsets, targets = index_corpus(corpus)
+
+    # Starts from the old PageRank values so only the change has to be converged on
+    start = np.array([ranks.get(page, 1 / len(pages)) for page in pages])
+    start /= start.sum()
+
+    if push:
+        new = push_graph(offsets, targets, damping_factor, start, tolerance)
+    else:
+        new = iterate_graph(offsets, targets, damping_factor, start, tolerance)
+
+    return corpus, {page: float(rank) for page, rank in zip(pages, new)}
+
+
+def teleport_matrix(pages, personalizations):
+    """
+    Return a NumPy array with one column per personalization in
+    `personalizations`, giving the probability of a random jump landing
+    on each page in `pages`.
+
+    Each personalization is either a dictionary mapping pages to weights,
+    or a collection of pages (e.g. the pages of one topic) which are
+    jumped to with equal probability.
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    teleport = np.zeros((len(pages), len(personalizations)))
+
+    for k, personalization in enumerate(personalizations):
+        if not isinstance(personalization, dict):
+            personalization = {page: 1 for page in personalization}
+        for page, weight in personalization.items():
+            teleport[index[page], k] = weight
+
+        total = teleport[:, k].sum()
+        if total <= 0:
+            raise ValueError(f"Personalization {k} has no weight on any page")
+        teleport[:, k] /= total
+
+    return teleport
+
+
+def personalize_graph(offsets, targets, damping_factor, teleport,
+                      tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return a NumPy array of personalized PageRank values for the graph
+    given by `offsets` and `targets`, with one column for each column of
+    the `teleport` matrix (see `teleport_matrix`).
+
+    All personalizations are iterated together, so every iteration is a
+    single pass over the links. Pages with no links are treated as linking
+    to every page, as in `propagate`.
+    """
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+    dangling = degrees == 0
+    sources = np.repeat(np.arange(total), degrees)
+
+    # Groups the links by the page they link to, so their shares can be summed in one go
+    targets = np.asarray(targets)
+    order = np.argsort(targets, kind="stable")
+    incoming = sources[order]
+    linked_to = targets[order]
+    heads = np.flatnonzero(np.r_[True, linked_to[1:] != linked_to[:-1]]) if len(targets) else []
+    receivers = linked_to[heads]
+
+    ranks = teleport.copy()
+    for _ in range(max_iterations):
+
+        # Sums PR(i) / NumLinks(i) over all the pages i that link to each page
+        share = ranks / np.maximum(degrees, 1)[:, None]
+        linked = np.zeros_like(ranks)
+        if len(targets):
+            linked[receivers] = np.add.reduceat(share[incoming], heads, axis=0)
+        linked += ranks[dangling].sum(axis=0) / total
+
+        new = (1 - damping_factor) * teleport + damping_factor * linked
+        change = np.abs(new - ranks).sum(axis=0).max()
+        ranks = new
+        if change < tolerance:
+            break
+
+    return ranks
+
+
+def walk_segments(offsets, targets, damping_factor, walks=WALKS, seed=None):
+    """
+    Return a NumPy array with `walks` random walks for every page of the
+    graph given by `offsets` and `targets`, storing the page each walk
+    ended on. A walk follows a random link with probability
+    `damping_factor` and otherwise stops.
+
+    The walks do not depend on any personalization, so they can be
+    computed once and reused by `sample_personalized`.
+    """
+    rng = np.random.default_rng(seed)
+    total = len(offsets) - 1
+    degrees = np.diff(offsets)
+
+    # Starts `walks` walkers on every page
+    ends = np.repeat(np.arange(total), walks)
+    walking = np.arange(len(ends))
+
+    while len(walking):
+
+        # Stops the walkers which do not follow a link
+        walking = walking[rng.random(len(walking)) < damping_factor]
+        current = ends[walking]
+
+        # Moves the rest along a random link, or to any page if there are none
+        degree = degrees[current]
+        link = offsets[current] + (rng.random(len(walking)) * degree).astype(np.int64)
+        moved = rng.integers(total, size=len(walking))
+        has_links = degree > 0
+        moved[has_links] = targets[link[has_links]]
+        ends[walking] = moved
+
+    return ends.reshape(total, walks)
+
+
+def sample_personalized(segments, teleport, samples=SAMPLES, seed=None):
+    """
+    Return a NumPy array estimating personalized PageRank values, with one
+    column for each column of the `teleport` matrix, from `samples` walks
+    per personalization taken out of the precomputed `segments` (see
+    `walk_segments`). Since walks are reused, accuracy is limited by the
+    number of walks stored per page as well as by `samples`.
+    """
+    rng = np.random.default_rng(seed)
+    total, walks = segments.shape
+    ranks = np.zeros(teleport.shape)
+
+    for k in range(teleport.shape[1]):
+
+        # Starts every walk on a page chosen by the personalization and looks up where one of its walks ended
+        starts = rng.choice(total, size=samples, p=teleport[:, k])
+        ends = segments[starts, rng.integers(walks, size=samples)]
+        ranks[:, k] = np.bincount(ends, minlength=total) / samples
+
+    return ranks
+
+
+def top_pages(pages, ranks, k):
+    """
+    Return a list with the `k` highest ranked pages for each column of
+    `ranks`, each given as a list of (page, rank) tuples in order.
+    """
+    k = min(k, len(pages))
+    best = []
+    for column in np.asarray(ranks).T:
+        top = np.argpartition(-column, k - 1)[:k]
+        top = top[np.argsort(-column[top], kind="stable")]
+        best.append([(pages[i], float(column[i])) for i in top])
+
+    return best
+
+
+def personalized_pagerank(corpus, damping_factor, personalizations, top=None,
+                          monte_carlo=False, segments=None, seed=None):
+    """
+    Return personalized PageRank values for each personalization in
+    `personalizations` (see `teleport_matrix`), as a list of dictionaries
+    mapping page names to PageRank values. If `top` is given, return the
+    `top` highest ranked (page, rank) tuples for each instead.
+
+    If `monte_carlo` is True the values are estimated from random walks,
+    which can be computed once by `walk_segments` and passed as `segments`.
+    """
+    pages, offsets, targets = index_corpus(corpus)
+    teleport = teleport_matrix(pages, personalizations)
+
+    if monte_carlo:
+
+        # Gives the walks and the sampling their own independent random streams
+        walk_seed, sample_seed = np.random.SeedSequence(seed).spawn(2)
+        if segments is None:
+            segments = walk_segments(offsets, targets, damping_factor, seed=walk_seed)
+        ranks = sample_personalized(segments, teleport, seed=sample_seed)
+    else:
+        ranks = personalize_graph(offsets, targets, damping_factor, teleport)
+
+    if top is not None:
+        return top_pages(pages, ranks, top)
+    return [
+        {page: float(rank) for page, rank in zip(pages, column)}
+        for column in ranks.T
+    ]
 
 
 # Creates a sum helper function
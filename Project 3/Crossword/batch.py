@@ -0,0 +1,184 @@
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from crossword import Crossword, Variable
+from generate import CrosswordCreator
+
+# Most jobs sharing a structure and word list solved by one worker task
+JOBS_PER_TASK = 8
+
+# Columns of the results CSV written by `batch`
+BATCH_FIELDS = ["structure", "words", "seed", "key", "status", "nodes", "time", "solution", "image"]
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python batch.py jobs cache [results]")
+    results = sys.argv[3] if len(sys.argv) == 4 else None
+
+    batch(load_jobs(sys.argv[1]), sys.argv[2], results)
+
+
+def load_jobs(filename):
+    """
+    Load a CSV file of jobs with columns structure, words and seed (which
+    may be empty for a deterministic search) into a list of tuples
+    (structure, words, seed).
+    """
+    jobs = []
+    with open(filename) as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            seed = int(row["seed"]) if row.get("seed") else None
+            jobs.append((row["structure"], row["words"], seed))
+    return jobs
+
+
+def file_hash(filename):
+    """Return the SHA-256 hex digest of the contents of `filename`."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def job_key(structure_hash, words_hash, seed):
+    """
+    Return the cache key of a job: a hash of the contents of its structure
+    and words files and of its seed, so renamed or copied inputs still hit
+    the cache and edited ones do not.
+    """
+    key = f"{structure_hash}:{words_hash}:{seed}".encode()
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+def cache_paths(cache, key):
+    """Return the paths of the cached solution and image for `key`."""
+    return os.path.join(cache, f"{key}.json"), os.path.join(cache, f"{key}.png")
+
+
+def cached(cache, key):
+    """
+    Return True if the job `key` has a cached solution and, unless it has
+    no solution, a cached image.
+    """
+    solution, image = cache_paths(cache, key)
+    if not os.path.exists(solution):
+        return False
+    with open(solution) as f:
+        return json.load(f)["assignment"] is None or os.path.exists(image)
+
+
+def solve_jobs(structure, words, jobs, cache):
+    """
+    Solve the jobs, a list of (seed, key) pairs, on the crossword given by
+    `structure` and `words`, writing each solution and image to `cache`.
+
+    The crossword is read and made arc consistent once; every seed then
+    searches from the same domains. Return a list of (key, result) pairs.
+    """
+    creator = CrosswordCreator(Crossword(structure, words))
+    results = []
+    for seed, key in jobs:
+        solution, image = cache_paths(cache, key)
+        if os.path.exists(solution):
+
+            # Only the image is missing, so the cached assignment is rendered again
+            with open(solution) as f:
+                result = json.load(f)
+            assignment = {
+                Variable(i, j, direction, len(word)): word
+                for i, j, direction, word in result["assignment"] or []
+            }
+        else:
+            creator.rng = random.Random(seed) if seed is not None else None
+            assignment = creator.solve()
+            result = {
+                "status": creator.stats["status"],
+                "nodes": creator.stats["nodes"],
+                "time": creator.stats["time"],
+                "assignment": None if assignment is None else sorted(
+                    [var.i, var.j, var.direction, word]
+                    for var, word in assignment.items()
+                )
+            }
+
+        # Writes the image first, so a cached solution always has its image unless rendering failed
+        if assignment and not os.path.exists(image):
+            creator.save(assignment, image)
+        if not os.path.exists(solution):
+            with open(solution + ".tmp", "w") as f:
+                json.dump(result, f)
+            os.replace(solution + ".tmp", solution)
+        results.append((key, result))
+    return results
+
+
+def batch(jobs, cache, output=None, workers=None):
+    """
+    Run every job, a tuple (structure, words, seed), in a pool of `workers`
+    processes, caching each solution and its image in the directory `cache`
+    under a hash of the job's inputs. Jobs already in the cache are not
+    solved again. Jobs sharing a structure and word list are grouped so the
+    crossword is only prepared once per task of up to `JOBS_PER_TASK` jobs.
+
+    Print a row for each job, and also write them to the CSV file `output`
+    if given. Return the rows, in the order of `jobs`.
+    """
+    os.makedirs(cache, exist_ok=True)
+    hashes = dict()
+    keys = []
+    groups = dict()
+    for structure, words, seed in jobs:
+        for filename in (structure, words):
+            if filename not in hashes:
+                hashes[filename] = file_hash(filename)
+        key = job_key(hashes[structure], hashes[words], seed)
+        keys.append(key)
+        if not cached(cache, key):
+            group = groups.setdefault((hashes[structure], hashes[words]), (structure, words, dict()))
+            group[2][key] = seed
+
+    # Solves the missing jobs, splitting large groups so they spread over the workers
+    if groups:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = []
+            for structure, words, pending in groups.values():
+                pending = [(seed, key) for key, seed in pending.items()]
+                for start in range(0, len(pending), JOBS_PER_TASK):
+                    futures.append(executor.submit(
+                        solve_jobs, structure, words, pending[start:start + JOBS_PER_TASK], cache
+                    ))
+            for future in as_completed(futures):
+                future.result()
+
+    rows = []
+    for (structure, words, seed), key in zip(jobs, keys):
+        solution, image = cache_paths(cache, key)
+        with open(solution) as f:
+            result = json.load(f)
+        rows.append([
+            structure, words, "" if seed is None else seed, key, result["status"],
+            result["nodes"], f"{result['time']:.4f}", solution,
+            image if os.path.exists(image) else ""
+        ])
+        print(f"{structure} {words} seed={seed}: {result['status']} ({key})")
+
+    if output:
+        with open(output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(BATCH_FIELDS)
+            writer.writerows(rows)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
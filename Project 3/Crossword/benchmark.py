@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+import tempfile
+
+from crossword import Crossword
+from generate import CrosswordCreator
+
+# Structures and words shipped with the project
+PUZZLES = [
+    ("data/structure0.txt", "data/words0.txt"),
+    ("data/structure1.txt", "data/words1.txt"),
+    ("data/structure2.txt", "data/words2.txt")
+]
+
+# Sizes (height, width) of the generated grids, filled using the largest word list
+GENERATED = [(9, 9), (13, 13), (15, 15), (21, 21)]
+SEED = 3
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [1, 2]:
+        sys.exit("Usage: python benchmark.py [words]")
+    words = sys.argv[1] if len(sys.argv) == 2 else PUZZLES[-1][1]
+
+    print(f"{'structure':<24}{'solved':>8}{'nodes':>10}{'backtracks':>12}{'time (s)':>12}")
+    for structure, vocabulary in PUZZLES:
+        report(os.path.basename(structure), structure, vocabulary)
+
+    # Writes each generated grid to a temporary structure file
+    for height, width in GENERATED:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write(random_structure(height, width, SEED))
+        try:
+            report(f"random {height}x{width}", f.name, words)
+        finally:
+            os.remove(f.name)
+
+
+def report(name, structure, words):
+    """
+    Solve the crossword given by `structure` and `words` and print
+    a row of search statistics.
+    """
+    creator = CrosswordCreator(Crossword(structure, words))
+    solved = creator.solve() is not None
+    stats = creator.stats
+    print(
+        f"{name:<24}{str(solved):>8}{stats['nodes']:>10}"
+        f"{stats['backtracks']:>12}{stats['time']:>12.4f}"
+    )
+
+
+def random_structure(height, width, seed):
+    """
+    Return the text of a random crossword structure of the given size.
+
+    Words run across every other row and down every other column, cut
+    into random lengths by blocked cells, so that they cross in a lattice.
+    """
+    rng = random.Random(seed)
+    open_cells = [[False] * width for _ in range(height)]
+
+    # Cuts a line of cells into words of 3 to 7 letters separated by blocks
+    def runs(size):
+        cells = []
+        k = rng.randint(0, 2)
+        while k + 3 <= size:
+            length = min(rng.randint(3, 7), size - k)
+            cells.extend(range(k, k + length))
+            k += length + rng.randint(1, 3)
+        return cells
+
+    for i in range(0, height, 2):
+        for j in runs(width):
+            open_cells[i][j] = True
+    for j in range(0, width, 2):
+        for i in runs(height):
+            open_cells[i][j] = True
+
+    return "\n".join(
+        "".join("_" if cell else "#" for cell in row)
+        for row in open_cells
+    ) + "\n"
+
+
+if __name__ == "__main__":
+    main()
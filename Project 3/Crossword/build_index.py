@@ -0,0 +1,19 @@
+import sys
+
+from crossword import WordIndex
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python build_index.py words index")
+
+    # Index the upper-cased vocabulary and save it for generate.py to memory-map
+    with open(sys.argv[1]) as f:
+        words = set(f.read().upper().splitlines())
+    WordIndex(words).save(sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
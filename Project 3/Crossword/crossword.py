@@ -1,20 +1,29 @@
+import bisect
+import json
+import mmap
+
+# Encoding of the words in a saved index, with the same number of bytes for every character
+WORD_ENCODING = "utf-32-le"
+
+
 class Variable():
 
     ACROSS = "across"
     DOWN = "down"
 
+    __slots__ = ("i", "j", "direction", "length", "cells")
+
     def __init__(self, i, j, direction, length):
         """Create a new variable with starting point, direction, and length."""
         self.i = i
         self.j = j
         self.direction = direction
         self.length = length
-        self.cells = []
-        for k in range(self.length):
-            self.cells.append(
-                (self.i + (k if self.direction == Variable.DOWN else 0),
-                 self.j + (k if self.direction == Variable.ACROSS else 0))
-            )
+        self.cells = tuple(
+            (self.i + (k if self.direction == Variable.DOWN else 0),
+             self.j + (k if self.direction == Variable.ACROSS else 0))
+            for k in range(self.length)
+        )
 
     def __hash__(self):
         return hash((self.i, self.j, self.direction, self.length))
@@ -35,6 +44,204 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class MappedBucket():
+
+    __slots__ = ("data", "offset", "length", "count", "encoding", "size")
+
+    def __init__(self, data, offset, length, count, encoding=WORD_ENCODING):
+        """
+        Create a read-only sequence of the `count` words of length `length`
+        stored back to back in `data` (e.g. a memory map) from `offset`,
+        in `encoding`, which must use the same number of bytes for every
+        character.
+        """
+        self.data = data
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.encoding = encoding
+        self.size = length * len("A".encode(encoding))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        if not 0 <= k < self.count:
+            raise IndexError("word index out of range")
+        start = self.offset + k * self.size
+        return self.data[start:start + self.size].decode(self.encoding)
+
+
+class WordIndex():
+
+    # First bytes of a word index file
+    MAGIC = b"CROSSWORD-INDEX\n"
+
+    def __init__(self, words=()):
+        """
+        Index a vocabulary for fast domain operations.
+
+        Words are bucketed by length and numbered within their bucket in
+        sorted order, so a set of words of one length can be stored as an
+        integer bitset whose bit k is set if the bucket's kth word is in it.
+        """
+        self.buckets = dict()
+        for word in sorted(words):
+            self.buckets.setdefault(len(word), []).append(word)
+
+        # Stores the bitset of all words of each length, shared by every domain that starts full
+        self.full = dict()
+
+        # Offsets of the letter bitsets in a mapped index file, converted on first use
+        self.offsets = dict()
+        self.data = None
+
+        # Map each (length, position) to the bitset of words having each letter there
+        self.positions = dict()
+        for length, bucket in self.buckets.items():
+            for position in range(length):
+                members = dict()
+                for k, word in enumerate(bucket):
+                    members.setdefault(word[position], []).append(k)
+                self.positions[length, position] = {
+                    letter: WordIndex.bitset(ids, len(bucket))
+                    for letter, ids in members.items()
+                }
+
+    @staticmethod
+    def bitset(ids, size):
+        """Return the bitset with bits `ids` set, out of `size` bits."""
+        bits = bytearray((size + 7) // 8)
+        for k in ids:
+            bits[k >> 3] |= 1 << (k & 7)
+        return int.from_bytes(bits, "little")
+
+    def save(self, filename):
+        """
+        Write the index to `filename` so `WordIndex.load` can memory-map it.
+
+        The file holds a JSON header giving the offset of each bucket and
+        letter bitset, followed by each bucket's words back to back in
+        `WORD_ENCODING` and the bitsets as little-endian bytes.
+        """
+        header = {"encoding": WORD_ENCODING, "buckets": []}
+        blocks = []
+        offset = 0
+        for length, bucket in sorted(self.buckets.items()):
+            words = "".join(bucket).encode(WORD_ENCODING)
+            size = (len(bucket) + 7) // 8
+            entry = {"length": length, "count": len(bucket), "words": offset, "letters": []}
+            blocks.append(words)
+            offset += len(words)
+            for position in range(length):
+                letters = []
+                for letter, bits in sorted(self.letters(length, position).items()):
+                    letters.append([letter, offset])
+                    blocks.append(bits.to_bytes(size, "little"))
+                    offset += size
+                entry["letters"].append(letters)
+            header["buckets"].append(entry)
+
+        header = json.dumps(header).encode()
+        with open(filename, "wb") as f:
+            f.write(WordIndex.MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for block in blocks:
+                f.write(block)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the index saved in `filename`, memory-mapped read-only so
+        that it is shared by every process using it. Words and bitsets are
+        only read from the file when needed.
+        """
+        with open(filename, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start = len(WordIndex.MAGIC)
+        if data[:start] != WordIndex.MAGIC:
+            raise ValueError(f"{filename} is not a word index")
+        size = int.from_bytes(data[start:start + 8], "little")
+        header = json.loads(data[start + 8:start + 8 + size])
+        base = start + 8 + size
+
+        index = cls()
+        index.data = data
+        for entry in header["buckets"]:
+            length, count = entry["length"], entry["count"]
+            index.buckets[length] = MappedBucket(
+                data, base + entry["words"], length, count, header.get("encoding", "ascii")
+            )
+            for position, letters in enumerate(entry["letters"]):
+                index.offsets[length, position] = {
+                    letter: base + offset for letter, offset in letters
+                }
+        return index
+
+    @staticmethod
+    def is_index(filename):
+        """Return True if `filename` is a saved word index."""
+        with open(filename, "rb") as f:
+            return f.read(len(WordIndex.MAGIC)) == WordIndex.MAGIC
+
+    def all(self, length):
+        """Return the bitset of all words of length `length`."""
+        if length not in self.full:
+            self.full[length] = (1 << len(self.buckets.get(length, []))) - 1
+        return self.full[length]
+
+    def letters(self, length, position):
+        """
+        Return a dictionary mapping each letter to the bitset of words of
+        length `length` with that letter at `position`.
+        """
+        key = (length, position)
+        if key not in self.positions and key in self.offsets:
+            size = (len(self.buckets[length]) + 7) // 8
+            self.positions[key] = {
+                letter: int.from_bytes(self.data[offset:offset + size], "little")
+                for letter, offset in self.offsets[key].items()
+            }
+        return self.positions.get(key, dict())
+
+    def matching(self, length, position, letter):
+        """
+        Return the bitset of words of length `length` with `letter`
+        at `position`.
+        """
+        return self.letters(length, position).get(letter, 0)
+
+    def bit(self, word):
+        """Return the bitset containing only `word`."""
+        bucket = self.buckets.get(len(word), [])
+        k = bisect.bisect_left(bucket, word)
+        if k == len(bucket) or bucket[k] != word:
+            raise KeyError(word)
+        return 1 << k
+
+    def words(self, length, bits):
+        """Return the list of words of length `length` in bitset `bits`."""
+        bucket = self.buckets.get(length, [])
+        words = []
+        while bits:
+            low = bits & -bits
+            words.append(bucket[low.bit_length() - 1])
+            bits ^= low
+        return words
+
+
+class Overlaps(dict):
+    """
+    Dictionary of overlaps that only stores overlapping pairs of
+    variables, and gives None for any other pair.
+    """
+
+    def __missing__(self, key):
+        return None
+
+
 class Crossword():
 
     def __init__(self, structure_file, words_file):
@@ -57,9 +264,15 @@ class Crossword():
                         row.append(False)
                 self.structure.append(row)
 
-        # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        # Save vocabulary list, or map a prebuilt index of it (see WordIndex.save),
+        # in which case the words are only available through the index
+        if WordIndex.is_index(words_file):
+            self.words = None
+            self.index = WordIndex.load(words_file)
+        else:
+            with open(words_file) as f:
+                self.words = set(f.read().upper().splitlines())
+            self.index = WordIndex(self.words)
 
         # Determine variable set
         self.variables = set()
@@ -108,26 +321,28 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored, found from the variables covering each cell
+        cells = dict()
+        for var in self.variables:
+            for k, cell in enumerate(var.cells):
+                cells.setdefault(cell, []).append((var, k))
+
+        self.overlaps = Overlaps()
+        for covering in cells.values():
+            for v1, k1 in covering:
+                for v2, k2 in covering:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+
+        # Precompute each variable's neighbors, in a fixed order
+        self.neighbor_map = {var: [] for var in self.variables}
+        for v1, v2 in self.overlaps:
+            self.neighbor_map[v1].append(v2)
+        for var, neighbors in self.neighbor_map.items():
+            self.neighbor_map[var] = tuple(sorted(
+                neighbors, key=lambda v: (v.i, v.j, v.direction)
+            ))
 
     def neighbors(self, var):
-        """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        """Given a variable, return a tuple of overlapping variables."""
+        return self.neighbor_map[var]
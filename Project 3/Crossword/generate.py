@@ -1,20 +1,102 @@
+import functools
+import html
+import multiprocessing
+import os
+import random
 import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 from crossword import *
 
+# Number of search nodes per unit of the Luby restart schedule
+RESTART_UNIT = 100
+
+# Solver configurations raced against each other by `portfolio`
+PORTFOLIO = [
+    {"ordering": "lcv", "seed": None, "restarts": False},
+    {"ordering": "lcv", "seed": 1, "restarts": True},
+    {"ordering": "lcv", "seed": 2, "restarts": True},
+    {"ordering": "plain", "seed": 3, "restarts": True}
+]
+
+# Event set in portfolio worker processes once any solver has finished
+STOP = None
+
+# Size in pixels of each cell of a saved image and of the border around it
+CELL_SIZE = 100
+CELL_BORDER = 2
+
+# Font letters are drawn in
+FONT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets/fonts/OpenSans-Regular.ttf")
+FONT_SIZE = 80
+
+
+class SearchLimit(Exception):
+    """Raised to abandon a search, with the reason as its argument."""
+
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, seed=None, ordering="lcv"):
         """
         Create new CSP crossword generate.
+
+        If `seed` is given, ties between variables and values are broken at
+        random using it. `ordering` is "lcv" to try values least constraining
+        first, or "plain" to try them in domain order.
         """
         self.crossword = crossword
+        self.index = crossword.index
+        self.rng = random.Random(seed) if seed is not None else None
+        self.ordering = ordering
+
+        # Limits on the search: a node count, a time.monotonic() deadline and a stop event
+        self.limit = None
+        self.deadline = None
+        self.stop = None
+
+        # Each domain is a bitset over the words of the variable's length (see WordIndex)
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.index.all(var.length)
+            for var in self.crossword.variables
+        }
+
+        # Stores (variable, old domain) for every domain change, so search can undo them
+        self.trail = []
+
+        # Caches each variable's neighbors and the positions where it overlaps them
+        self.neighbors = self.crossword.neighbor_map
+        self.overlap_positions = {
+            var: sorted(set(
+                self.crossword.overlaps[var, neighbor][0]
+                for neighbor in self.neighbors[var]
+            ))
             for var in self.crossword.variables
         }
 
+        # Counts, for each variable and overlapping position, how many words left
+        # in its domain have each letter there, kept up to date by `set_domain`
+        self.sizes = dict()
+        self.supports = dict()
+        for var in self.crossword.variables:
+            self.count_supports(var)
+
+        # Groups the variables by length, since only those can share a word
+        self.same_length = dict()
+        for var in self.crossword.variables:
+            self.same_length.setdefault(var.length, []).append(var)
+
+        # Stores the words used by the current partial assignment
+        self.used = set()
+
+        # Whether arc consistency left every domain non-empty, once `solve` has enforced it
+        self.arc_consistent = None
+
+        # Keeps track of the work done by the last search
+        self.stats = {"nodes": 0, "backtracks": 0, "restarts": 0, "time": 0.0}
+
     def letter_grid(self, assignment):
         """
         Return 2D array representing a given assignment.
@@ -46,52 +128,130 @@ class CrosswordCreator():
 
     def save(self, assignment, filename):
         """
-        Save crossword assignment to an image file.
+        Save crossword assignment to an image file, or to an SVG file
+        if `filename` ends in ".svg".
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
         letters = self.letter_grid(assignment)
+        if filename.lower().endswith(".svg"):
+            with open(filename, "w") as f:
+                f.write(self.svg(letters))
+            return
+
+        from PIL import Image
 
         # Create a blank canvas
         img = Image.new(
             "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
+            (self.crossword.width * CELL_SIZE,
+             self.crossword.height * CELL_SIZE),
             "black"
         )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
 
+        # Pastes a prerendered tile for each open cell, blank or with its letter
         for i in range(self.crossword.height):
             for j in range(self.crossword.width):
+                if self.crossword.structure[i][j]:
+                    img.paste(
+                        cell_tile(letters[i][j]),
+                        (j * CELL_SIZE + CELL_BORDER, i * CELL_SIZE + CELL_BORDER)
+                    )
+
+        img.save(filename)
 
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
+    def svg(self, letters):
+        """
+        Return the text of an SVG image of the grid of `letters`,
+        drawn like `save` draws it.
+        """
+        width = self.crossword.width * CELL_SIZE
+        height = self.crossword.height * CELL_SIZE
+        interior_size = CELL_SIZE - 2 * CELL_BORDER
+        lines = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">',
+            f'<rect width="{width}" height="{height}" fill="black"/>',
+            f'<g font-family="Open Sans, sans-serif" font-size="{FONT_SIZE}" '
+            f'text-anchor="middle" dominant-baseline="central">'
+        ]
+        for i in range(self.crossword.height):
+            for j in range(self.crossword.width):
                 if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
+                    x = j * CELL_SIZE + CELL_BORDER
+                    y = i * CELL_SIZE + CELL_BORDER
+                    lines.append(
+                        f'<rect x="{x}" y="{y}" width="{interior_size}" '
+                        f'height="{interior_size}" fill="white"/>'
+                    )
                     if letters[i][j]:
-                        w, h = draw.textsize(letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
+                        lines.append(
+                            f'<text x="{x + interior_size / 2}" y="{y + interior_size / 2}">'
+                            f'{html.escape(letters[i][j])}</text>'
                         )
+        lines.append("</g>")
+        lines.append("</svg>")
+        return "\n".join(lines) + "\n"
 
-        img.save(filename)
-
-    def solve(self):
+    def solve(self, restarts=False, timeout=None):
         """
         Enforce node and arc consistency, and then solve the CSP.
+
+        If `restarts` is True, the search restarts whenever it has used up
+        its share of nodes in the Luby schedule (see `luby`). The search
+        gives up after `timeout` seconds if given. `self.stats["status"]`
+        records whether the crossword was "solved", proven "unsatisfiable",
+        or the search ended by "timeout" or was "stopped".
+
+        Consistency is only enforced on the first call; the search then
+        always returns to the domains it left, so later calls (e.g. after
+        changing `self.rng`) start straight from them.
+        """
+        start = time.perf_counter()
+        self.stats = {"nodes": 0, "backtracks": 0, "restarts": 0, "time": 0.0}
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+
+        if self.arc_consistent is None:
+            self.enforce_node_consistency()
+            self.arc_consistent = self.ac3()
+            self.trail = []
+        result = None
+        status = "unsatisfiable"
+        if self.arc_consistent:
+            run = 1
+            while True:
+                if restarts:
+                    self.limit = self.stats["nodes"] + luby(run) * RESTART_UNIT
+                try:
+                    result = self.backtrack(dict())
+                    status = "solved" if result is not None else "unsatisfiable"
+                    break
+                except SearchLimit as limit:
+
+                    # Returns to the domains left by arc consistency before starting again
+                    self.undo(0)
+                    self.used = set()
+                    if limit.args[0] != "nodes":
+                        status = limit.args[0]
+                        break
+                    self.stats["restarts"] += 1
+                    run += 1
+            self.undo(0)
+            self.used = set()
+
+        self.limit = None
+        self.stats["status"] = status
+        self.stats["time"] = time.perf_counter() - start
+        return result
+
+    def check_limits(self):
         """
-        self.enforce_node_consistency()
-        self.ac3()
-        return self.backtrack(dict())
+        Raise SearchLimit if the search has used up its nodes or time,
+        or has been told to stop.
+        """
+        if self.limit is not None and self.stats["nodes"] >= self.limit:
+            raise SearchLimit("nodes")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchLimit("timeout")
+        if self.stop is not None and self.stop.is_set():
+            raise SearchLimit("stopped")
 
     def enforce_node_consistency(self):
         """
@@ -99,19 +259,11 @@ class CrosswordCreator():
         (Remove any values that are inconsistent with a variable's unary
          constraints; in this case, the length of the word.)
         """
-        # Iterates over each variable in the crossword with their domains
+        # Keeps only the words of the right length in each variable's domain
         for variable in self.domains:
-
-            # Creates a copy of the variable's domain so that the variable's domain can be changed without errors
-            copy = self.domains[variable].copy()
-
-            # Iterates over each word in the variable's domain
-            for word in copy:
-                
-                # Removes the word from that variable's domain if it isnt the right length
-                if len(word) != variable.length:
-                    self.domains[variable].remove(word)
-
+            domain = self.domains[variable] & self.index.all(variable.length)
+            if domain != self.domains[variable]:
+                self.set_domain(variable, domain)
 
     def revise(self, x, y):
         """
@@ -122,45 +274,27 @@ class CrosswordCreator():
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
         """
-        # Creates a variable to track whether or not the domain of x was revised
-        revised = False
-
-        # Creates a variable to store the number of possible combinations of words in the domains of variables x and y
-        possible = 0
-
         # Stores the pair representing an overlap if there is any
         overlap = self.crossword.overlaps[x, y]
 
         # There is no constraining arc between x and y so no revisions will be made
-        if overlap == None:
-            return revised
-        
-        # Creates a copy of x's domain to iterate over instead of the original so an error does not occur if the domain is changed
-        x_copy = self.domains[x].copy()
-
-        # Iterates over all the words in x's domain to compare them with all the words in y's domain
-        for x_word in x_copy:
-
-            # Creates a variable to store the number of possible combinations of words in the domains of variables x and y
-            possible = 0
-
-            for y_word in self.domains[y]:
-                
-                # Checks if the word from variable x has at least one other agrreing word in the second variable y 
-                if x_word[overlap[0]] == y_word[overlap[1]]:
-                    possible += 1
-                
-            if possible == 0:
-
-                # If there is a conflict in which character would be the value of a square, the word is removed from x as no words agreed
-                self.domains[x].remove(x_word)
-
-                # Revised is changed to true to indicater that there ws a change made to x's domain
-                revised = True
-                
-                    
-        return revised
-
+        if overlap is None:
+            return False
+
+        # Collects the words of x whose overlapping letter is used by at least one word left in y's domain
+        supported = 0
+        y_letters = self.index.letters(y.length, overlap[1])
+        for letter, x_words in self.index.letters(x.length, overlap[0]).items():
+            if self.domains[y] & y_letters.get(letter, 0):
+                supported |= x_words
+
+        # Removes every word from x which no word in y agrees with
+        revised = self.domains[x] & supported
+        if revised == self.domains[x]:
+            return False
+
+        self.set_domain(x, revised)
+        return True
 
     def ac3(self, arcs=None):
         """
@@ -172,33 +306,40 @@ class CrosswordCreator():
         return False if one or more domains end up empty.
         """
         # Includes all the arcs in the problem if arcs is None
-        if arcs == None:
-            arcs =[]
-            for v1 in self.domains:
-                for v2 in self.domains:
-                    if v1 != v2:
-                        if self.crossword.overlaps[v1, v2] != None:
-                            arcs.append((v1, v2))
-
-        # Creates a queue of the arcs
-        queue = [arc for arc in arcs]
-        
-        while len(queue) != 0:
-            # Chooses an arc from the que
-            (i, j) = queue.pop(0)
+        if arcs is None:
+            arcs = [
+                (v1, v2) for v1 in self.domains
+                for v2 in self.neighbors[v1]
+            ]
+
+        # Creates a queue of the arcs, skipping arcs which are already waiting in it
+        queue = deque(dict.fromkeys(arcs))
+        queued = set(queue)
+
+        while queue:
+            # Chooses an arc from the queue
+            arc = queue.popleft()
+            queued.discard(arc)
+            i, j = arc
 
             if self.revise(i, j):
                 # If the domain is empty the problem cannot be solved so false is returned
-                if len(self.domains[i]) == 0:
+                if not self.domains[i]:
                     return False
-                
+
                 # Adds the neighbours to the current variable arc to the queue as long as it is not the original neighbour
-                for neighbour in self.crossword.neighbors(i):
-                    if neighbour != j:
+                for neighbour in self.neighbors[i]:
+                    if neighbour != j and (neighbour, i) not in queued:
                         queue.append((neighbour, i))
-                        
+                        queued.add((neighbour, i))
+
         return True
-    
+
+    def words(self, var):
+        """
+        Return the list of words left in the domain of `var`.
+        """
+        return self.index.words(var.length, self.domains[var])
 
     def assignment_complete(self, assignment):
         """
@@ -247,6 +388,95 @@ class CrosswordCreator():
         return True
                     
 
+    def consistent_value(self, var, word, assignment):
+        """
+        Return True if assigning `word` to `var` is consistent with the
+        consistent `assignment`, checking only against the neighbors of `var`
+        and the words already used; return False otherwise.
+        """
+        if word in self.used:
+            return False
+
+        for neighbor in self.neighbors[var]:
+            if neighbor in assignment:
+                i, j = self.crossword.overlaps[var, neighbor]
+                if word[i] != assignment[neighbor][j]:
+                    return False
+
+        return True
+
+    def infer(self, var, word, assignment):
+        """
+        Update `self.domains` after assigning `word` to `var`, removing the
+        word from other variables and maintaining arc consistency with the
+        neighbors of `var`. All changes are recorded on `self.trail`.
+
+        Return False if a domain ends up empty; return True otherwise.
+        """
+        bit = self.index.bit(word)
+        self.set_domain(var, bit)
+
+        arcs = [
+            (neighbor, var) for neighbor in self.neighbors[var]
+            if neighbor not in assignment
+        ]
+
+        # Removes the word from every other unassigned variable, since words can only be used once
+        for other in self.same_length[var.length]:
+            if other != var and other not in assignment and self.domains[other] & bit:
+                self.set_domain(other, self.domains[other] & ~bit)
+                if not self.domains[other]:
+                    return False
+                arcs.extend(
+                    (neighbor, other) for neighbor in self.neighbors[other]
+                    if neighbor not in assignment
+                )
+
+        return self.ac3(arcs)
+
+    def undo(self, mark):
+        """
+        Restore every domain changed since the trail had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain = self.trail.pop()
+            self.set_domain(var, domain, record=False)
+
+    def count_supports(self, var):
+        """
+        Recount the size of the domain of `var` and, for each position where
+        `var` overlaps a neighbor, the number of words in its domain with
+        each letter at that position.
+        """
+        self.sizes[var] = self.domains[var].bit_count()
+        for position in self.overlap_positions[var]:
+            self.supports[var, position] = {
+                letter: (self.domains[var] & words).bit_count()
+                for letter, words in self.index.letters(var.length, position).items()
+            }
+
+    def set_domain(self, var, domain, record=True):
+        """
+        Replace the domain of `var` with the bitset `domain`, updating its
+        size and letter counts by only the words added or removed, and
+        recording the old domain on `self.trail` if `record` is True.
+        """
+        old = self.domains[var]
+        if record:
+            self.trail.append((var, old))
+        self.domains[var] = domain
+
+        removed = old & ~domain
+        added = domain & ~old
+        self.sizes[var] += added.bit_count() - removed.bit_count()
+        for position in self.overlap_positions[var]:
+            counts = self.supports[var, position]
+            for letter, words in self.index.letters(var.length, position).items():
+                if removed & words:
+                    counts[letter] -= (removed & words).bit_count()
+                if added & words:
+                    counts[letter] += (added & words).bit_count()
+
     def order_domain_values(self, var, assignment):
         """
         Return a list of values in the domain of `var`, in order by
@@ -254,51 +484,46 @@ class CrosswordCreator():
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
-        # Creates a list to store the values in the domain of var in order of their constraint value
-        domain = []
-
-        # Populates the domain list with all the words in the variables domain
-        for word in self.domains[var]:
-            domain.append(word)
-        
-        # Sorts list based on each words constraint_value
-        sorted(domain, key= lambda word: self.constraint_value(word, var, assignment))
-
-        return domain
+        # Looks up each unassigned neighbour's overlap and domain size once for all the values
+        arcs = self.open_arcs(var, assignment)
+
+        # Sorts the words in the variable's domain by each word's constraint_value, breaking ties at random if seeded
+        if self.rng is None:
+            return sorted(
+                self.words(var),
+                key=lambda word: self.constraint_value(word, var, assignment, arcs)
+            )
+        return sorted(
+            self.words(var),
+            key=lambda word: (self.constraint_value(word, var, assignment, arcs), self.rng.random())
+        )
 
+    def open_arcs(self, var, assignment):
+        """
+        Return a list of (i, j, neighbor) for every unassigned neighbor of
+        `var`, where `var`'s ith character overlaps the neighbor's jth.
+        """
+        return [
+            self.crossword.overlaps[var, neighbor] + (neighbor,)
+            for neighbor in self.neighbors[var]
+            if neighbor not in assignment
+        ]
 
-        
-    def constraint_value(self, word, var, assignment):
+    def constraint_value(self, word, var, assignment, arcs=None):
         """
         Returns the number of word choices for a variables's neighbours
         which are eliminated if the given word is assigned to the variable
         """
-        # Stores the number of word choices for the neighbouring variables which are eliminated if the word is chosen
-        constraint_count = 0
-
-        # Makes sure to not consider variables already in the assignment list
-        for variable in self.crossword.variables:
-            if variable not in assignment:
-
-                # Makes sure the cureent variable being iterated over isnt equal to the initial variable
-                if variable != var:
-
-                    # Stores the possible overlap of both variables
-                    overlap = self.crossword.overlaps[var, variable]
+        if arcs is None:
+            arcs = self.open_arcs(var, assignment)
 
-                    # Confirms the twovariables are neighbours
-                    if overlap != None:
-
-                        # Iterates over all the possible values of the neighbouring variables
-                        for test_word in self.domains[variable]:
-
-                            # Increments the constraint_count variable if a conflict is found between the variables
-                            if word[overlap[0]] != test_word[overlap[1]]:
-                                constraint_count += 1
+        # Counts the words of each unassigned neighbour which do not have the word's letter where they overlap
+        constraint_count = 0
+        for i, j, neighbor in arcs:
+            constraint_count += self.sizes[neighbor] - self.supports[neighbor, j].get(word[i], 0)
 
         return constraint_count
 
-
     def select_unassigned_variable(self, assignment):
         """
         Return an unassigned variable not already part of `assignment`.
@@ -307,37 +532,19 @@ class CrosswordCreator():
         degree. If there is a tie, any of the tied variables are acceptable
         return values.
         """
-        # Creates a variable to store and track the best variable to select next
-        best_variable = None
-
-        # Creates a counter variable to ensure  during the first loop the best variable is set to the current variable as there was no previous best variable
-        counter = 0
-
-        # Searches variables which have not already been assigned a value
-        for variable in self.domains:
-            if variable not in assignment:
-
-                # Makes the current variable the best variable during the first run of the loop
-                if counter == 0:
-                    # Increments counter so that other loops use the best_variable gotten in the previous loop
-                    counter += 1
-                    best_variable = variable
-                    continue
-                
-                # Changes the best variable to the current variable if it has fewer values in its domain
-                if len(self.domains[variable]) < len(self.domains[best_variable]):
-                    best_variable = variable
-                    continue
-
-                # Changes the best variable to the current variable if they have the same number of value in their domains but the current variable has more neighbours
-                if len(self.domains[variable]) == len(self.domains[best_variable]):
-                    if len(self.crossword.neighbors(variable)) >= len(self.crossword.neighbors(best_variable)):
-                        best_variable = variable
-
-            
-
-        return best_variable
-
+        unassigned = [variable for variable in self.domains if variable not in assignment]
+        if not unassigned:
+            return None
+
+        if self.rng is None:
+            return min(
+                unassigned,
+                key=lambda variable: (self.sizes[variable], -len(self.neighbors[variable]))
+            )
+        return min(
+            unassigned,
+            key=lambda variable: (self.sizes[variable], -len(self.neighbors[variable]), self.rng.random())
+        )
 
     def backtrack(self, assignment):
         """
@@ -346,46 +553,192 @@ class CrosswordCreator():
 
         `assignment` is a mapping from variables (keys) to words (values).
 
+        After each assignment arc consistency is maintained (see `infer`),
+        and the domain changes are undone from `self.trail` on backtracking.
+
         If no assignment is possible, return None.
         """
+        # Resynchronizes the used words if search was started from a new assignment
+        if len(self.used) != len(assignment):
+            self.used = set(assignment.values())
+
         if self.assignment_complete(assignment):
             return assignment
-        
+
         variable = self.select_unassigned_variable(assignment)
 
-        for word in self.domains[variable]:
-            copy = assignment.copy()
-            copy[variable] = word
-            if self.consistent(copy):
-                assignment[variable]= word
-                result = self.backtrack(assignment)
+        if self.ordering == "lcv":
+            values = self.order_domain_values(variable, assignment)
+        else:
+            values = self.words(variable)
+            if self.rng is not None:
+                self.rng.shuffle(values)
+
+        for word in values:
+            if not self.consistent_value(variable, word, assignment):
+                continue
 
-                if result != None:
+            self.check_limits()
+            self.stats["nodes"] += 1
+            mark = len(self.trail)
+            assignment[variable] = word
+            self.used.add(word)
+
+            if self.infer(variable, word, assignment):
+                result = self.backtrack(assignment)
+                if result is not None:
                     return result
-                
-                del assignment[variable]
+
+            # Undoes the assignment and everything inferred from it
+            self.stats["backtracks"] += 1
+            self.used.discard(word)
+            del assignment[variable]
+            self.undo(mark)
 
         return None
 
 
+@functools.lru_cache(maxsize=None)
+def load_font():
+    """
+    Return the font letters are drawn in, loaded once per process.
+    """
+    from PIL import ImageFont
+    return ImageFont.truetype(FONT_FILE, FONT_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def cell_tile(letter):
+    """
+    Return the image of the interior of an open cell holding `letter`,
+    or blank if `letter` is None, rendered once per process.
+    """
+    from PIL import Image, ImageDraw
+    interior_size = CELL_SIZE - 2 * CELL_BORDER
+
+    # The tile is one pixel wider than the interior, like the rectangles drawn around the cells
+    tile = Image.new("RGBA", (interior_size + 1, interior_size + 1), "white")
+    if letter:
+        draw = ImageDraw.Draw(tile)
+        draw.text(
+            (interior_size / 2, interior_size / 2),
+            letter, fill="black", font=load_font(), anchor="mm"
+        )
+    return tile
+
+
+def luby(i):
+    """
+    Return the `i`th term (counting from 1) of the Luby sequence
+    1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+    """
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+def set_stop(event):
+    """
+    Store the portfolio's stop event in a worker process.
+    """
+    global STOP
+    STOP = event
+
+
+def run_config(structure, words, config, deadline=None):
+    """
+    Solve the crossword given by `structure` and `words` with the solver
+    configuration `config` (see `PORTFOLIO`), stopping early if the
+    portfolio's stop event is set or at `deadline`, a time.time() value
+    shared by every process. Return a tuple (config, assignment, stats).
+    """
+    creator = CrosswordCreator(
+        Crossword(structure, words),
+        seed=config["seed"], ordering=config["ordering"]
+    )
+    creator.stop = STOP
+
+    # A configuration that waited in the queue only gets the time left
+    timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+    assignment = creator.solve(restarts=config["restarts"], timeout=timeout)
+    return config, assignment, creator.stats
+
+
+def portfolio(structure, words, configs=PORTFOLIO, workers=None, timeout=None):
+    """
+    Race a solver for each configuration in `configs` across a pool of
+    `workers` processes on the crossword given by `structure` and `words`.
+
+    As soon as one solver finds an assignment or proves there is none, the
+    rest are told to stop. Every solver, including those still queued when
+    `workers` is less than the number of configurations, gives up `timeout`
+    seconds after the portfolio started. Return a tuple (assignment, config,
+    stats) from that solver, or (None, None, None) if every solver ran out
+    of time.
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    stop = multiprocessing.Event()
+    with ProcessPoolExecutor(workers or len(configs), initializer=set_stop, initargs=(stop,)) as executor:
+        pending = {
+            executor.submit(run_config, structure, words, config, deadline)
+            for config in configs
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                config, assignment, stats = future.result()
+                if stats["status"] in ("solved", "unsatisfiable"):
+                    stop.set()
+                    for other in pending:
+                        other.cancel()
+                    return assignment, config, stats
+
+    return None, None, None
+
+
 def main():
 
     # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    usage = "Usage: python generate.py [--portfolio] [--timeout=SECONDS] structure words [output]"
+    portfolio_mode = False
+    timeout = None
+    args = []
+    for arg in sys.argv[1:]:
+        if arg == "--portfolio":
+            portfolio_mode = True
+        elif arg.startswith("--timeout="):
+            try:
+                timeout = float(arg[len("--timeout="):])
+            except ValueError:
+                sys.exit(usage)
+        else:
+            args.append(arg)
+    if len(args) not in [2, 3]:
+        sys.exit(usage)
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    structure = args[0]
+    words = args[1]
+    output = args[2] if len(args) == 3 else None
 
     # Generate crossword
     crossword = Crossword(structure, words)
     creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    if portfolio_mode:
+        assignment, config, stats = portfolio(structure, words, timeout=timeout)
+        if config is not None:
+            print(f"Finished by {config} in {stats['time']:.4f}s")
+        timed_out = config is None
+    else:
+        assignment = creator.solve(timeout=timeout)
+        timed_out = creator.stats["status"] == "timeout"
 
     # Print result
-    if assignment is None:
+    if timed_out:
+        print("Timed out")
+    elif assignment is None:
         print("No solution.")
     else:
         creator.print(assignment)
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+
+from nim import NimAI, optimal_actions, policy_accuracy, solve_table, train, train_vectorized, winning
+
+# Total numbers of training games after which each trainer's policy is scored
+GAMES = [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000]
+
+# Policy accuracies for which the training time needed to reach them is reported
+LEVELS = [0.5, 0.9, 0.99, 1.0]
+
+# Trainers compared, each continuing to train the AI it is given up to a number of games
+TRAINERS = {
+    "single": lambda n, player: train(n, report=n, player=player),
+    "vectorized": lambda n, player: train_vectorized(n, report=n, player=player, seed=0),
+    "2 workers": lambda n, player: train_vectorized(n, workers=2, player=player, seed=0)
+}
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) != 1:
+        sys.exit("Usage: python benchmark.py")
+
+    # Checks the nim-sum rule against the solution of every state
+    ai = NimAI()
+    wins = solve_table(ai)
+    assert all(winning(ai.state(index)) == wins[index] for index in range(len(ai.q)))
+    assert all(
+        bool(optimal_actions(ai.state(index))) == wins[index]
+        for index in range(1, len(ai.q))
+    )
+    print(f"{np.count_nonzero(wins)} of {len(wins)} states are wins for the player to move")
+
+    print(f"{'trainer':<12}{'games':>10}{'time (s)':>12}{'accuracy':>10}")
+    for name, trainer in TRAINERS.items():
+        report(name, trainer, wins)
+
+
+def report(name, trainer, wins):
+    """
+    Train an AI with `trainer` through each number of games in `GAMES`,
+    printing the policy accuracy and training time at each, then the time
+    needed to first reach each accuracy in `LEVELS`.
+    """
+    player = NimAI()
+    elapsed = 0.0
+    reached = dict()
+    for games in GAMES:
+
+        # Silences the trainer's own progress reports
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            player = trainer(games, player)
+        elapsed += time.perf_counter() - start
+
+        accuracy = policy_accuracy(player, wins)
+        print(f"{name:<12}{games:>10}{elapsed:>12.3f}{accuracy:>10.3f}")
+        for level in LEVELS:
+            if accuracy >= level and level not in reached:
+                reached[level] = (games, elapsed)
+
+    for level in LEVELS:
+        if level in reached:
+            games, elapsed = reached[level]
+            print(f"{name}: accuracy {level:.0%} after {games} games in {elapsed:.3f}s")
+        else:
+            print(f"{name}: accuracy {level:.0%} not reached")
+
+
+if __name__ == "__main__":
+    main()
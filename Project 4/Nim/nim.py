@@ -1,36 +1,54 @@
 import math
+import os
 import random
 import time
+from collections.abc import Set
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Number of training games between progress reports and checkpoints
+REPORT_EVERY = 10000
+
+# Number of games played in lockstep by `train_vectorized`; larger batches play more
+# games per second but learn less from each, as every game reads Q-values a step stale
+BATCH_SIZE = 256
+
+# Number of games each worker process plays between merges of the Q-tables
+MERGE_EVERY = 20000
+
+# Largest dense Q-table (rows times columns) `new_ai` will create
+DENSE_LIMIT = 1 << 20
 
 
 class Nim():
 
-    def __init__(self, initial=[1, 3, 5, 7]):
+    def __init__(self, initial=[1, 3, 5, 7], misere=True):
         """
         Initialize game board.
         Each game board has
             - `piles`: a list of how many elements remain in each pile
             - `player`: 0 or 1 to indicate which player's turn
             - `winner`: None, 0, or 1 to indicate who the winner is
+            - `misere`: True if the player who takes the last object
+              loses, False if they win
         """
-        self.piles = initial.copy()
+        self.piles = list(initial)
         self.player = 0
         self.winner = None
+        self.misere = misere
 
     @classmethod
     def available_actions(cls, piles):
         """
         Nim.available_actions(piles) takes a `piles` list as input
-        and returns all of the available actions `(i, j)` in that state.
+        and returns all of the available actions `(i, j)` in that state,
+        as a lazy `Actions` view that only lists them when iterated.
 
         Action `(i, j)` represents the action of removing `j` items
         from pile `i` (where piles are 0-indexed).
         """
-        actions = set()
-        for i, pile in enumerate(piles):
-            for j in range(1, pile + 1):
-                actions.add((i, j))
-        return actions
+        return Actions(piles)
 
     @classmethod
     def other_player(cls, player):
@@ -67,24 +85,132 @@ class Nim():
 
         # Check for a winner
         if all(pile == 0 for pile in self.piles):
-            self.winner = self.player
+            self.winner = self.player if self.misere else Nim.other_player(self.player)
+
+
+class Actions(Set):
+
+    __slots__ = ("piles",)
+
+    def __init__(self, piles):
+        """
+        Create a set of the actions available from `piles`, which supports
+        `in`, `len` and iteration without building them all, and compares
+        and combines with other sets like a `set`.
+        """
+        self.piles = list(piles)
+
+    def __contains__(self, action):
+        try:
+            i, j = action
+            return 0 <= i < len(self.piles) and 1 <= j <= self.piles[i]
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        for i, pile in enumerate(self.piles):
+            for j in range(1, pile + 1):
+                yield (i, j)
+
+    def __len__(self):
+        return sum(self.piles)
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # Results of set operations are ordinary sets of actions, not views of piles
+        return set(iterable)
 
 
 class NimAI():
 
-    def __init__(self, alpha=0.5, epsilon=0.1):
+    def __init__(self, alpha=0.5, epsilon=0.1, initial=[1, 3, 5, 7], misere=True):
         """
-        Initialize AI with an empty Q-learning dictionary,
-        an alpha (learning) rate, and an epsilon rate.
+        Initialize AI with an empty Q-table, an alpha (learning) rate,
+        and an epsilon rate, for the game started from piles `initial`
+        (misère if `misere` is True, see `Nim`).
 
-        The Q-learning dictionary maps `(state, action)`
-        pairs to a Q-value (a number).
-         - `state` is a tuple of remaining piles, e.g. (1, 1, 4, 4)
-         - `action` is a tuple `(i, j)` for an action
+        The Q-table `self.q` is an array with a row for every state of the
+        game started from piles `initial` and a column for every action:
+         - `state` is a list of remaining piles, e.g. [1, 1, 4, 4], whose
+           row is its number in mixed radix (see `state`)
+         - `action` is a tuple `(i, j)` for an action, whose column is
+           given by `self.action_index`
+        Columns of actions that are not available in a state stay 0.
         """
-        self.q = dict()
         self.alpha = alpha
         self.epsilon = epsilon
+        self.initial = list(initial)
+        self.misere = misere
+
+        # Pile i counts for strides[i] in the row of a state
+        self.strides = []
+        states = 1
+        for pile in self.initial:
+            self.strides.append(states)
+            states *= pile + 1
+
+        # Numbers every action (i, j) that is available in some state
+        self.actions = [
+            (i, j)
+            for i, pile in enumerate(self.initial)
+            for j in range(1, pile + 1)
+        ]
+        self.action_index = {action: k for k, action in enumerate(self.actions)}
+
+        # Stores, for each state, its row and the columns of its available actions in the order of `self.actions`
+        self.indices = dict()
+        self.state_actions = []
+        for index in range(states):
+            state = self.state(index)
+            self.indices[tuple(state)] = index
+            self.state_actions.append(np.array([
+                k for k, (i, j) in enumerate(self.actions) if j <= state[i]
+            ], dtype=np.intp))
+
+        # Stores the row reached from each row by each column (-1 if the action is not available)
+        self.successors = np.full((states, len(self.actions)), -1, dtype=np.intp)
+        for index, actions in enumerate(self.state_actions):
+            for k in actions:
+                i, j = self.actions[k]
+                self.successors[index, k] = index - j * self.strides[i]
+
+        # Marks the available columns of each row, which are listed first in its row of `action_table`
+        self.valid = self.successors >= 0
+        self.counts = self.valid.sum(axis=1)
+        self.action_table = np.zeros((states, len(self.actions)), dtype=np.intp)
+        for index, actions in enumerate(self.state_actions):
+            self.action_table[index, :len(actions)] = actions
+
+        self.q = np.zeros((states, len(self.actions)))
+
+        # Counts the updates of each Q-value, and the updates and their total size since `progress` was last called
+        self.visits = np.zeros((states, len(self.actions)), dtype=np.int64)
+        self.updates = 0
+        self.changes = 0.0
+
+        # Number of training games played, kept across checkpoints
+        self.games = 0
+
+        # Caches the greatest Q-value of each state's available actions and the first
+        # column holding it (-1 if there are none), updated by `set_q_value`
+        self.best = [0.0] * states
+        self.best_action = [int(actions[0]) if len(actions) else -1 for actions in self.state_actions]
+
+    def state_index(self, state):
+        """
+        Return the row of the Q-table for the piles `state`.
+        """
+        return self.indices[tuple(state)]
+
+    def state(self, index):
+        """
+        Return the piles of the state in row `index` of the Q-table.
+        """
+        state = []
+        for pile in self.initial:
+            index, remaining = divmod(index, pile + 1)
+            state.append(remaining)
+        return state
 
     def update(self, old_state, action, new_state, reward):
         """
@@ -92,24 +218,34 @@ class NimAI():
         in that state, a new resulting state, and the reward received
         from taking that action.
         """
-        old = self.get_q_value(old_state, action)
-        best_future = self.best_future_reward(new_state)
-        self.update_q_value(old_state, action, old, reward, best_future)
+        self.learn(
+            self.state_index(old_state), self.action_index[action],
+            self.state_index(new_state), reward
+        )
+
+    def learn(self, index, column, new_index, reward):
+        """
+        Update the Q-value in row `index` and column `column`, given the
+        row `new_index` of the resulting state and the reward received.
+        """
+        old = self.q.item(index, column)
+        value = old + self.alpha * ((reward + self.best[new_index]) - old)
+        self.set_q_value(index, column, value)
+        self.visits[index, column] += 1
+        self.updates += 1
+        self.changes += abs(value - old)
 
     def get_q_value(self, state, action):
         """
         Return the Q-value for the state `state` and the action `action`.
-        If no Q-value exists yet in `self.q`, return 0.
+        If no Q-value has been learned yet, return 0.
         """
-        # Variable to test the presence of the q value in the q value dictionary
-        present = self.q.get((tuple(state), action), None)
-
-        # Checks i the q value is present in the dictionary of q values and returns 0 if it isnt
-        if present == None:
+        # States and actions outside the game started from `initial` have no Q-value
+        index = self.indices.get(tuple(state))
+        column = self.action_index.get(action)
+        if index is None or column is None:
             return 0
-        
-        # Otherwise, returns the q value as it exists in the dictionary of q values
-        return self.q[tuple(state), action]
+        return float(self.q[index, column])
 
     def update_q_value(self, state, action, old_q, reward, future_rewards):
         """
@@ -126,7 +262,30 @@ class NimAI():
         `alpha` is the learning rate, and `new value estimate`
         is the sum of the current reward and estimated future rewards.
         """
-        self.q[tuple(state), action] = old_q + self.alpha *((reward + future_rewards) - old_q)
+        self.set_q_value(
+            self.state_index(state), self.action_index[action],
+            old_q + self.alpha * ((reward + future_rewards) - old_q)
+        )
+
+    def set_q_value(self, index, column, value):
+        """
+        Store `value` in row `index` and column `column` of the Q-table,
+        keeping the best action of the row up to date. The row is only
+        searched again if the value of its best action went down.
+        """
+        self.q[index, column] = value
+        best_action = self.best_action[index]
+        if column == best_action:
+            if value < self.best[index]:
+                actions = self.state_actions[index]
+                best_action = int(actions[np.argmax(self.q[index, actions])])
+                self.best_action[index] = best_action
+                self.best[index] = float(self.q[index, best_action])
+            else:
+                self.best[index] = value
+        elif value > self.best[index] or (value == self.best[index] and column < best_action):
+            self.best_action[index] = column
+            self.best[index] = value
 
     def best_future_reward(self, state):
         """
@@ -135,27 +294,14 @@ class NimAI():
         of their Q-values.
 
         Use 0 as the Q-value if a `(state, action)` pair has no
-        Q-value in `self.q`. If there are no available actions in
+        Q-value yet. If there are no available actions in
         `state`, return 0.
         """
-        # Finds the possible actions that can be taken in the current set
-        actions = []
-        for i in range(len(state)):
-            for j in range(1, state[i] + 1):
-                actions.append((i, j))
-
-        # Returns 0 if there are no possible actions
-        if len(actions) < 1:
-            return 0
-        
-        # Assume no (state, action) pairs have been assigned a q value so the highest is 0 
-        if len(self.q) < 1: 
+        # The best Q-value of a state without actions, or outside the Q-table, is 0
+        index = self.indices.get(tuple(state))
+        if index is None:
             return 0
-        
-        # Finds the maximum q of all the actions possible
-        maximum_q = max(self.get_q_value(state, action) for action in actions)
-
-        return maximum_q
+        return self.best[index]
 
     def choose_action(self, state, epsilon=True):
         """
@@ -172,87 +318,627 @@ class NimAI():
         If multiple actions have the same Q-value, any of those
         options is an acceptable return value.
         """
-        # Finds the possible actions that can be taken in the current set
-        actions = []
-        for i in range(len(state)):
-            for j in range(1, state[i] + 1):
-                actions.append((i, j))
+        # Treats every action of a state outside the Q-table as having a Q-value of 0
+        index = self.indices.get(tuple(state))
+        if index is None:
+            actions = [(i, j) for i, pile in enumerate(state) for j in range(1, pile + 1)]
+            if not actions:
+                return None
+            if epsilon and random.random() < self.epsilon:
+                return random.choice(actions)
+            return actions[0]
+
+        column = self.choose_column(index, epsilon)
+        if column < 0:
+            return None
+        return self.actions[column]
+
+    def choose_column(self, index, epsilon=True):
+        """
+        Return the column of the action to take in row `index`, chosen
+        like `choose_action` does, or -1 if there are no actions.
+        """
+        # Takes a random action with probability epsilon
+        if epsilon and random.random() < self.epsilon:
+            actions = self.state_actions[index]
+            if len(actions):
+                return int(actions[random.randrange(len(actions))])
+
+        # Otherwise takes the first action with the greatest Q-value
+        return self.best_action[index]
+
+    def progress(self):
+        """
+        Return a tuple (coverage, change): the fraction of available
+        (state, action) pairs updated at least once, and the mean absolute
+        change of the Q-values updated since the last call.
+        """
+        pairs = sum(len(actions) for actions in self.state_actions)
+        coverage = np.count_nonzero(self.visits) / pairs
+        change = self.changes / self.updates if self.updates else 0.0
+        self.updates = 0
+        self.changes = 0.0
+        return coverage, change
+
+    def save(self, filename):
+        """
+        Save the Q-table, update counts, rates and number of games played
+        to `filename` as a NumPy archive, replacing it only once written.
+        """
+        with open(filename + ".tmp", "wb") as f:
+            np.savez(
+                f, q=self.q, visits=self.visits, initial=self.initial, misere=self.misere,
+                alpha=self.alpha, epsilon=self.epsilon, games=self.games
+            )
+        os.replace(filename + ".tmp", filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the AI saved in `filename` by `save`, which is a
+        `SymmetricNimAI` if that is what saved it.
+        """
+        with np.load(filename) as data:
+            if "sparse" in data:
+                return SymmetricNimAI.load(filename)
+            ai = cls(
+                alpha=float(data["alpha"]), epsilon=float(data["epsilon"]),
+                initial=data["initial"].tolist(), misere=bool(data["misere"])
+            )
+            ai.q = data["q"]
+            ai.visits = data["visits"]
+            ai.games = int(data["games"])
+        ai.refresh()
+        return ai
+
+    def refresh(self):
+        """
+        Recompute the best Q-value and best action of every row, after
+        the Q-table has been changed other than by `set_q_value`.
+        """
+        rows = np.arange(len(self.q))
+        best_action = self.best_columns(rows)
+        self.best = np.where(self.counts > 0, self.q[rows, best_action], 0.0).tolist()
+        self.best_action = np.where(self.counts > 0, best_action, -1).tolist()
+
+    def best_columns(self, index):
+        """
+        Return, for each row in the array `index`, the first available
+        column with the greatest Q-value (0 for rows without actions).
+        """
+        return np.where(self.valid[index], self.q[index], -np.inf).argmax(axis=1)
+
+    def learn_batch(self, index, column, new_index, reward):
+        """
+        Update the Q-values in rows `index` and columns `column` at once,
+        given arrays of the rows `new_index` of the resulting states and
+        the rewards `reward` received, like `learn` does for each.
+
+        Future rewards are read from the Q-table before any of the updates.
+        Repeated (row, column) pairs are updated once, towards the mean of
+        their new value estimates. `refresh` must be called before the
+        best actions are used again.
+        """
+        future = np.where(
+            self.counts[new_index] > 0,
+            self.q[new_index, self.best_columns(new_index)], 0.0
+        )
+
+        # Averages the estimates of each distinct pair
+        keys = index * len(self.actions) + column
+        keys, inverse, repeats = np.unique(keys, return_inverse=True, return_counts=True)
+        estimate = np.bincount(inverse, weights=reward + future) / repeats
+
+        old = self.q.flat[keys]
+        value = old + self.alpha * (estimate - old)
+        self.q.flat[keys] = value
+        self.visits.flat[keys] += repeats
+        self.updates += len(keys)
+        self.changes += float(np.abs(value - old).sum())
+
+
+class SymmetricNimAI():
+
+    def __init__(self, alpha=0.5, epsilon=0.1, initial=[1, 3, 5, 7], misere=True):
+        """
+        Initialize AI like `NimAI`, but storing only the Q-values learned
+        so far, for games too large for a table of every state.
+
+        States that are permutations of each other share their Q-values:
+        `self.q` maps each canonical state (see `canonical`) to a
+        dictionary from canonical actions `(size, j)`, removing `j` items
+        from a pile of `size`, to Q-values. Missing Q-values are 0.
+        """
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.initial = list(initial)
+        self.misere = misere
+        self.q = dict()
+
+        # Caches the greatest Q-value of each canonical state and an action with it, None for an unlearned one
+        self.best = dict()
+
+        # Counts the updates and their total size since `progress` was last called
+        self.updates = 0
+        self.changes = 0.0
+
+        # Number of training games played, kept across checkpoints
+        self.games = 0
+
+    @staticmethod
+    def canonical(state):
+        """
+        Return the canonical form of the piles `state`: its non-empty
+        piles in increasing order, as a tuple.
+        """
+        return tuple(sorted(pile for pile in state if pile))
+
+    @staticmethod
+    def available(key):
+        """
+        Return the number of distinct canonical actions in the canonical
+        state `key`.
+        """
+        return sum(set(key))
+
+    @staticmethod
+    def canonical_actions(key):
+        """
+        Yield the canonical actions of the canonical state `key`, in order
+        of pile size and then of the number of items removed.
+        """
+        for size in sorted(set(key)):
+            for j in range(1, size + 1):
+                yield (size, j)
+
+    def update(self, old_state, action, new_state, reward):
+        """
+        Update Q-learning model, given an old state, an action taken
+        in that state, a new resulting state, and the reward received
+        from taking that action.
+        """
+        old = self.get_q_value(old_state, action)
+        best_future = self.best_future_reward(new_state)
+        self.update_q_value(old_state, action, old, reward, best_future)
+
+    def get_q_value(self, state, action):
+        """
+        Return the Q-value for the state `state` and the action `action`.
+        If no Q-value has been learned yet, return 0.
+        """
+        i, j = action
+        return self.q.get(self.canonical(state), dict()).get((state[i], j), 0)
+
+    def update_q_value(self, state, action, old_q, reward, future_rewards):
+        """
+        Update the Q-value for the state `state` and the action `action`
+        like `NimAI.update_q_value`, keeping the best action of the state
+        up to date.
+        """
+        i, j = action
+        key = self.canonical(state)
+        action = (state[i], j)
+        value = old_q + self.alpha * ((reward + future_rewards) - old_q)
+        values = self.q.setdefault(key, dict())
+        values[action] = value
+        self.updates += 1
+        self.changes += abs(value - old_q)
+
+        # Searches the learned values again only if the best one went down, or was
+        # an unlearned action and there are none left
+        best, best_action = self.best.get(key, (0, None))
+        if value >= best:
+            self.best[key] = (value, action)
+        elif action == best_action or (best_action is None and len(values) == self.available(key)):
+            self.best[key] = self.best_learned(key)
+
+    def best_learned(self, key):
+        """
+        Return a tuple (value, action) of the greatest Q-value of the
+        canonical state `key` and an action with it, or (0, None) if that
+        is 0 from an action without a Q-value.
+        """
+        values = self.q[key]
+        best_action = max(values, key=values.get)
+        if values[best_action] < 0 and len(values) < self.available(key):
+            return 0, None
+        return values[best_action], best_action
+
+    def best_future_reward(self, state):
+        """
+        Given a state `state`, return the maximum Q-value of the actions
+        available in it, using 0 for actions without a Q-value and if
+        there are no available actions.
+        """
+        return self.best.get(self.canonical(state), (0, None))[0]
+
+    def choose_action(self, state, epsilon=True):
+        """
+        Given a state `state`, return an action `(i, j)` to take, chosen
+        like `NimAI.choose_action` does but without listing every action.
+        """
+        total = sum(state)
+        if total == 0:
+            return None
+
+        # Takes a random action with probability epsilon, picking one of all the objects left
+        if epsilon and random.random() < self.epsilon:
+            k = random.randrange(total)
+            for i, pile in enumerate(state):
+                if k < pile:
+                    return (i, k + 1)
+                k -= pile
+
+        # Otherwise takes an action with the greatest Q-value, the first unlearned one if that is 0
+        key = self.canonical(state)
+        best_action = self.best.get(key, (0, None))[1]
+        if best_action is None:
+            values = self.q.get(key, dict())
+            best_action = next(
+                action for action in self.canonical_actions(key) if action not in values
+            )
+        size, j = best_action
+        return (list(state).index(size), j)
+
+    def progress(self):
+        """
+        Return a tuple (coverage, change) like `NimAI.progress`, where the
+        coverage only counts the actions of states that have been seen.
+        """
+        learned = sum(len(values) for values in self.q.values())
+        pairs = sum(self.available(key) for key in self.q)
+        coverage = learned / pairs if pairs else 0.0
+        change = self.changes / self.updates if self.updates else 0.0
+        self.updates = 0
+        self.changes = 0.0
+        return coverage, change
+
+    def save(self, filename):
+        """
+        Save the learned Q-values, rates and number of games played to
+        `filename` as a NumPy archive, like `NimAI.save`.
+        """
+        rows = [
+            key + (size, j, value)
+            for key, values in self.q.items()
+            for (size, j), value in values.items()
+        ]
+        # Stores the piles of each state right-aligned, padded with empty piles
+        dtype = np.min_scalar_type(max(self.initial, default=0))
+        states = np.zeros((len(rows), len(self.initial)), dtype=dtype)
+        actions = np.zeros((len(rows), 2), dtype=dtype)
+        values = np.zeros(len(rows))
+        for k, row in enumerate(rows):
+            key = row[:-3]
+            if key:
+                states[k, -len(key):] = key
+            actions[k] = row[-3:-1]
+            values[k] = row[-1]
+        with open(filename + ".tmp", "wb") as f:
+            np.savez(
+                f, sparse=True, states=states, actions=actions, values=values,
+                initial=self.initial, misere=self.misere,
+                alpha=self.alpha, epsilon=self.epsilon, games=self.games
+            )
+        os.replace(filename + ".tmp", filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the AI saved in `filename` by `save`.
+        """
+        with np.load(filename) as data:
+            ai = cls(
+                alpha=float(data["alpha"]), epsilon=float(data["epsilon"]),
+                initial=data["initial"].tolist(), misere=bool(data["misere"])
+            )
+            ai.games = int(data["games"])
+            for state, (size, j), value in zip(
+                data["states"].tolist(), data["actions"].tolist(), data["values"].tolist()
+            ):
+                key = ai.canonical(state)
+                ai.q.setdefault(key, dict())[size, j] = value
+
+        # Rebuilds the best action of every state
+        for key in ai.q:
+            ai.best[key] = ai.best_learned(key)
+        return ai
 
-        # Creates a variable to store whether or not a random action is to be made or not
-        choice = None
 
-        # Makes a weighted choice on whether the best action is chosen or just a random one
-        # Where random action = 1
-        # And best action = 0
-        if epsilon:
-            choice = random.choices([0, 1], [1 - self.epsilon, self.epsilon])[0]
+def new_ai(initial=[1, 3, 5, 7], misere=True, alpha=0.5, epsilon=0.1):
+    """
+    Return an untrained AI for the game started from piles `initial`: a
+    `NimAI` if its Q-table has at most `DENSE_LIMIT` entries, otherwise a
+    `SymmetricNimAI`.
+    """
+    states = 1
+    for pile in initial:
+        states *= pile + 1
+    if states * sum(initial) <= DENSE_LIMIT:
+        return NimAI(alpha=alpha, epsilon=epsilon, initial=initial, misere=misere)
+    return SymmetricNimAI(alpha=alpha, epsilon=epsilon, initial=initial, misere=misere)
 
-        # Return any action which has the same q value as the greatest q value 
-        if not epsilon or choice == 0:
-            maximum = self.best_future_reward(state)
-            for action in actions:
-                if self.get_q_value(state, action) == maximum:
-                    return action
 
-        # Returns a random action if a random action is set to be taken
-        if choice == 1:
-            num = random.choice(range(len(actions)))
-            return actions[num]
-        
+def resume(checkpoint, player=None, initial=[1, 3, 5, 7], misere=True):
+    """
+    Return the AI to train: the one saved in `checkpoint` if it exists,
+    otherwise `player`, or a new AI for `initial` and `misere` if that
+    is None.
+    """
+    if checkpoint is not None and os.path.exists(checkpoint):
+        player = NimAI.load(checkpoint)
+        print(f"Resuming from game {player.games}")
+    elif player is None:
+        player = new_ai(initial, misere)
+    return player
 
 
-def train(n):
+def train(n, report=REPORT_EVERY, checkpoint=None, player=None, initial=[1, 3, 5, 7], misere=True):
     """
     Train an AI by playing `n` games against itself.
+
+    Every `report` games, print the training speed and the progress of the
+    Q-table (see `NimAI.progress`). If `checkpoint` is given, the AI is
+    saved there as often, and training resumes from it if it exists, until
+    `n` games have been played in all. Training also continues `player`
+    if given, and otherwise starts a new AI (see `new_ai`) for the game
+    started from piles `initial`, misère if `misere` is True.
     """
+    player = resume(checkpoint, player, initial, misere)
+    start = time.perf_counter()
+    played = 0
+    while player.games < n:
+        if isinstance(player, SymmetricNimAI):
+            play_game(player)
+        else:
+            play_rows(player)
 
-    player = NimAI()
+        player.games += 1
+        played += 1
+        if player.games % report == 0 or player.games == n:
+            coverage, change = player.progress()
+            rate = played / (time.perf_counter() - start)
+            print(
+                f"Played {player.games} games ({rate:.0f} games/s), "
+                f"coverage {coverage:.1%}, mean |dQ| {change:.4f}"
+            )
+            if checkpoint is not None:
+                player.save(checkpoint)
 
-    # Play n games
-    for i in range(n):
-        print(f"Playing training game {i + 1}")
-        game = Nim()
+    print("Done training")
 
-        # Keep track of last move made by either player
-        last = {
-            0: {"state": None, "action": None},
-            1: {"state": None, "action": None}
-        }
+    # Return the trained AI
+    return player
 
-        # Game loop
-        while True:
 
-            # Keep track of current state and action
-            state = game.piles.copy()
-            action = player.choose_action(game.piles)
+def play_rows(player):
+    """
+    Train the `NimAI` `player` by playing one game against itself on
+    Q-table rows, without Nim objects or pile lists.
+    """
+    successors = player.successors
+    index = player.state_index(player.initial)
 
-            # Keep track of last state and action
-            last[game.player]["state"] = state
-            last[game.player]["action"] = action
+    # The player who takes the last object loses in misère Nim and wins otherwise
+    reward = -1 if player.misere else 1
 
-            # Make move
-            game.move(action)
-            new_state = game.piles.copy()
+    # Keep track of last move made by either player
+    last = [None, None]
+    turn = 0
 
-            # When game is over, update Q values with rewards
-            if game.winner is not None:
-                player.update(state, action, new_state, -1)
-                player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
-                    new_state,
-                    1
-                )
-                break
+    # Game loop
+    while True:
+        column = player.choose_column(index)
+        new_index = successors.item(index, column)
+
+        # When game is over, update Q values with rewards
+        if new_index == 0:
+            player.learn(index, column, new_index, reward)
+            if last[1 - turn] is not None:
+                player.learn(*last[1 - turn], new_index, -reward)
+            return
+
+        # If game is continuing, no rewards yet
+        elif last[1 - turn] is not None:
+            player.learn(*last[1 - turn], new_index, 0)
+
+        last[turn] = (index, column)
+        index = new_index
+        turn = 1 - turn
+
+
+def play_game(player):
+    """
+    Train `player` by playing one game of `Nim` against itself, using
+    only the `NimAI` interface.
+    """
+    game = Nim(player.initial, player.misere)
+
+    # Keep track of last move made by either player
+    last = {
+        0: {"state": None, "action": None},
+        1: {"state": None, "action": None}
+    }
 
-            # If game is continuing, no rewards yet
-            elif last[game.player]["state"] is not None:
+    # Game loop
+    while True:
+
+        # Keep track of current state and action
+        state = game.piles.copy()
+        action = player.choose_action(game.piles)
+
+        # Keep track of last state and action
+        last[game.player]["state"] = state
+        last[game.player]["action"] = action
+
+        # Make move
+        game.move(action)
+        new_state = game.piles.copy()
+
+        # When game is over, update Q values with rewards
+        if game.winner is not None:
+            reward = 1 if game.winner != game.player else -1
+            player.update(state, action, new_state, reward)
+            if last[game.player]["state"] is not None:
                 player.update(
                     last[game.player]["state"],
                     last[game.player]["action"],
                     new_state,
-                    0
+                    -reward
                 )
+            return
+
+        # If game is continuing, no rewards yet
+        elif last[game.player]["state"] is not None:
+            player.update(
+                last[game.player]["state"],
+                last[game.player]["action"],
+                new_state,
+                0
+            )
+
+
+def play_batch(player, n, batch, rng):
+    """
+    Train `player` by playing `n` games against itself, `batch` of them
+    at a time in lockstep, with the NumPy random generator `rng`.
+
+    Each step, every game in progress picks its action epsilon-greedily,
+    and all of their Q-value updates are applied together (see
+    `NimAI.learn_batch`). Each finished game is replaced by a new one
+    until `n` have been started.
+    """
+    start = player.state_index(player.initial)
+    size = min(batch, n)
+    index = np.full(size, start, dtype=np.intp)
+    turn = np.zeros(size, dtype=np.intp)
+
+    # Keep track of last move made by either player in each game (-1 before their first)
+    last_index = np.full((2, size), -1, dtype=np.intp)
+    last_column = np.zeros((2, size), dtype=np.intp)
+
+    active = np.ones(size, dtype=bool)
+    started = size
+    while active.any():
+        games = np.flatnonzero(active)
+        rows = index[games]
+
+        # Chooses a random available action with probability epsilon, otherwise the best one
+        explore = rng.random(len(games)) < player.epsilon
+        random_columns = player.action_table[
+            rows, (rng.random(len(games)) * player.counts[rows]).astype(np.intp)
+        ]
+        columns = np.where(explore, random_columns, player.best_columns(rows))
+        new_rows = player.successors[rows, columns]
+
+        # The mover is rewarded for ending the game; otherwise the other player's last move is updated
+        over = new_rows == 0
+        reward = -1.0 if player.misere else 1.0
+        other = 1 - turn[games]
+        previous = last_index[other, games]
+        answered = previous >= 0
+        player.learn_batch(
+            np.concatenate([rows[over], previous[answered]]),
+            np.concatenate([columns[over], last_column[other, games][answered]]),
+            np.concatenate([new_rows[over], new_rows[answered]]),
+            np.concatenate([np.full(over.sum(), reward), np.where(over[answered], -reward, 0.0)])
+        )
+
+        last_index[turn[games], games] = rows
+        last_column[turn[games], games] = columns
+        index[games] = new_rows
+        turn[games] = other
+
+        # Starts new games in place of the finished ones while there are games left to play
+        finished = games[over]
+        player.games += len(finished)
+        restart = finished[:max(0, n - started)]
+        started += len(restart)
+        index[restart] = start
+        turn[restart] = 0
+        last_index[:, restart] = -1
+        active[finished[len(restart):]] = False
+
+    player.refresh()
+
+
+def train_worker(q, initial, misere, alpha, epsilon, n, batch, seed):
+    """
+    Train a copy of the Q-table `q` by playing `n` games in lockstep with
+    random seed `seed`. Return a tuple (q, visits, updates, changes) of
+    the new table, how often each entry was updated, and the number and
+    total size of the updates.
+    """
+    player = NimAI(alpha=alpha, epsilon=epsilon, initial=initial, misere=misere)
+    player.q = q.copy()
+    player.refresh()
+    play_batch(player, n, batch, np.random.default_rng(seed))
+    return player.q, player.visits, player.updates, player.changes
+
+
+def train_vectorized(
+    n, batch=BATCH_SIZE, workers=None, report=REPORT_EVERY, checkpoint=None, seed=None,
+    player=None, initial=[1, 3, 5, 7], misere=True
+):
+    """
+    Train an AI by playing `n` games against itself, `batch` at a time in
+    lockstep (see `play_batch`), reporting and checkpointing like `train`.
+
+    If `workers` is more than 1, that many processes each play up to
+    `MERGE_EVERY` games from the current Q-table, which is then replaced
+    by the mean of their tables, weighting each entry by how often each
+    worker updated it. Progress is then reported after every merge.
+    Starting the processes costs more than they save on small games such
+    as [1, 3, 5, 7], which one process trains fastest.
+
+    Lockstep training needs a dense `NimAI`, so raise ValueError if the
+    game from `initial` is too large for one (see `new_ai`).
+    """
+    player = resume(checkpoint, player, initial, misere)
+    if not isinstance(player, NimAI):
+        raise ValueError("Vectorized training needs a dense Q-table")
+    seeds = np.random.SeedSequence(seed)
+    start = time.perf_counter()
+    first = player.games
+    executor = ProcessPoolExecutor(workers) if workers and workers > 1 else None
+    try:
+        while player.games < n:
+            if executor is None:
+                games = min(report - player.games % report, n - player.games)
+                play_batch(player, games, batch, np.random.default_rng(seeds.spawn(1)[0]))
+            else:
+                games = min(MERGE_EVERY * workers, n - player.games)
+                shares = [games // workers + (k < games % workers) for k in range(workers)]
+                futures = [
+                    executor.submit(
+                        train_worker, player.q, player.initial, player.misere,
+                        player.alpha, player.epsilon, share, batch, child
+                    )
+                    for share, child in zip(shares, seeds.spawn(workers)) if share
+                ]
+                results = [future.result() for future in futures]
+
+                # Entries no worker updated keep their value
+                weights = sum(visits for _, visits, _, _ in results)
+                total = sum(q * visits for q, visits, _, _ in results)
+                player.q = np.where(weights > 0, total / np.maximum(weights, 1), player.q)
+                player.visits += weights
+                player.updates += sum(updates for _, _, updates, _ in results)
+                player.changes += sum(changes for _, _, _, changes in results)
+                player.games += games
+                player.refresh()
+
+            coverage, change = player.progress()
+            rate = (player.games - first) / (time.perf_counter() - start)
+            print(
+                f"Played {player.games} games ({rate:.0f} games/s), "
+                f"coverage {coverage:.1%}, mean |dQ| {change:.4f}"
+            )
+            if checkpoint is not None:
+                player.save(checkpoint)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     print("Done training")
 
@@ -260,6 +946,76 @@ def train(n):
     return player
 
 
+def nim_sum(piles):
+    """
+    Return the bitwise XOR of the pile sizes `piles`.
+    """
+    total = 0
+    for pile in piles:
+        total ^= pile
+    return total
+
+
+def winning(piles, misere=True):
+    """
+    Return True if the player to move from `piles` can force a win.
+
+    In normal play, they win exactly when the nim-sum is not 0. In misère
+    play (as in `Nim` by default) that holds while some pile has more than
+    one object; once every pile has at most one object, they win exactly
+    when an even number of objects are left.
+    """
+    if not misere or any(pile > 1 for pile in piles):
+        return nim_sum(piles) != 0
+    return sum(piles) % 2 == 0
+
+
+def optimal_actions(piles, misere=True):
+    """
+    Return the set of actions `(i, j)` from `piles` that leave the other
+    player in a losing position, which is empty if `piles` is lost.
+    """
+    actions = set()
+    piles = list(piles)
+    for i, j in Nim.available_actions(piles):
+        piles[i] -= j
+        if not winning(piles, misere):
+            actions.add((i, j))
+        piles[i] += j
+    return actions
+
+
+def solve_table(ai):
+    """
+    Return a boolean array with, for each row of the Q-table of `ai`,
+    whether the player to move from that state can force a win.
+
+    Each state is solved from the states it leads to, which always have
+    smaller rows. The player to move once every pile is empty has won in
+    misère play, since the other player took the last object, and has
+    lost otherwise.
+    """
+    wins = np.zeros(len(ai.q), dtype=bool)
+    wins[0] = ai.misere
+    for index in range(1, len(ai.q)):
+        wins[index] = not wins[ai.successors[index, ai.valid[index]]].all()
+    return wins
+
+
+def policy_accuracy(ai, wins=None):
+    """
+    Return the fraction of winnable states in which the greedy action of
+    `ai` leaves the other player in a losing state, using `wins` from
+    `solve_table` if given. Every action is as good as any other in a
+    lost state, so those are not counted.
+    """
+    if wins is None:
+        wins = solve_table(ai)
+    rows = np.flatnonzero(wins & (ai.counts > 0))
+    best_action = np.array(ai.best_action)[rows]
+    return float(np.mean(~wins[ai.successors[rows, best_action]]))
+
+
 def play(ai, human_player=None):
     """
     Play human game against the AI.
@@ -272,7 +1028,7 @@ def play(ai, human_player=None):
         human_player = random.randint(0, 1)
 
     # Create new game
-    game = Nim()
+    game = Nim(ai.initial, ai.misere)
 
     # Game loop
     while True:
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from shopping import BACKENDS, TEST_SIZE, ApproximateNeighbors, evaluate, load_data, predict, train_model
+
+# Seed of the train/test split, so every backend sees the same one
+SEED = 0
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python benchmark.py data")
+
+    evidence, labels = load_data(sys.argv[1])
+    X_train, X_test, y_train, y_test = train_test_split(
+        evidence, labels, test_size=TEST_SIZE, random_state=SEED
+    )
+
+    print(
+        f"{'backend':<14}{'fit (s)':>10}{'predict (s)':>13}{'rows/s':>12}"
+        f"{'sensitivity':>13}{'specificity':>13}{'exact':>8}"
+    )
+    exact = None
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        model = train_model(X_train, y_train, backend)
+        fit = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predictions = predict(model, X_test)
+        elapsed = time.perf_counter() - start
+
+        # Compares each backend's predictions with those of the exact search on standardized features
+        if backend == "kd_tree":
+            exact = predictions
+        agreement = f"{np.mean(predictions == exact):.3f}" if exact is not None else "-"
+
+        sensitivity, specificity = evaluate(y_test, predictions)
+        print(
+            f"{backend:<14}{fit:>10.3f}{elapsed:>13.3f}{len(X_test) / elapsed:>12.0f}"
+            f"{sensitivity:>13.3f}{specificity:>13.3f}{agreement:>8}"
+        )
+
+        if backend == "approximate":
+            saved_and_loaded(model, X_test, predictions)
+
+
+def saved_and_loaded(model, evidence, predictions):
+    """
+    Save the `ApproximateNeighbors` index `model`, load it back, and check
+    that it still makes `predictions` for `evidence`.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "index.npz")
+        start = time.perf_counter()
+        model.save(filename)
+        loaded = ApproximateNeighbors.load(filename)
+        elapsed = time.perf_counter() - start
+        same = np.array_equal(predict(loaded, evidence), predictions)
+    print(f"approximate index saved and loaded in {elapsed:.3f}s, same predictions: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,78 @@
 import csv
+import hashlib
+import itertools
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 
 TEST_SIZE = 0.4
 
+# Number of rows parsed at a time by `load_data`
+CHUNK_ROWS = 1 << 16
+
+# Nearest-neighbor backends `train_model` can fit
+BACKENDS = ["brute", "kd_tree", "ball_tree", "approximate"]
+
+# Number of test rows each task of `predict` classifies
+PREDICT_CHUNK = 4096
+
+# Number of clusters of training points searched for each query by `ApproximateNeighbors`
+PROBES = 4
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'June', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Columns of the evidence, in order, with the type of their values or the name of their encoding
+EVIDENCE = [
+    ("Administrative", int),
+    ("Administrative_Duration", float),
+    ("Informational", int),
+    ("Informational_Duration", float),
+    ("ProductRelated", int),
+    ("ProductRelated_Duration", float),
+    ("BounceRates", float),
+    ("ExitRates", float),
+    ("PageValues", float),
+    ("SpecialDay", float),
+    ("Month", "category"),
+    ("OperatingSystems", int),
+    ("Browser", int),
+    ("Region", int),
+    ("TrafficType", int),
+    ("VisitorType", "category"),
+    ("Weekend", "category")
+]
+
+# Type categorical values are read as, long enough for every known value
+CATEGORY = "U32"
+
+# Encodings of the categorical columns and of the labels
+ENCODINGS = {
+    "Month": MONTHS.index,
+    "VisitorType": lambda value: 1 if value == 'Returning_Visitor' else 0,
+    "Weekend": lambda value: 1 if value == 'TRUE' else 0,
+    "Revenue": lambda value: 1 if value == 'TRUE' else 0
+}
+
+# Remembers the code of every value encoded so far, by column
+CODES = dict()
+
+# Version of the arrays cached by `load_data`, to bump whenever the parsing or ENCODINGS change
+CACHE_VERSION = 1
+
 
 def main():
 
     # Check command-line arguments
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python shopping.py data")
+    if len(sys.argv) not in [2, 3] or (len(sys.argv) == 3 and sys.argv[2] not in BACKENDS):
+        sys.exit(f"Usage: python shopping.py data [{'|'.join(BACKENDS)}]")
+    backend = sys.argv[2] if len(sys.argv) == 3 else "brute"
 
     # Load data from spreadsheet and split into train and test sets
     evidence, labels = load_data(sys.argv[1])
@@ -20,8 +81,8 @@ def main():
     )
 
     # Train model and make predictions
-    model = train_model(X_train, y_train)
-    predictions = model.predict(X_test)
+    model = train_model(X_train, y_train, backend)
+    predictions = predict(model, X_test)
     sensitivity, specificity = evaluate(y_test, predictions)
 
     # Print results
@@ -31,13 +92,15 @@ def main():
     print(f"True Negative Rate: {100 * specificity:.2f}%")
 
 
-def load_data(filename):
+def load_data(filename, cache=True):
     """
-    Load shopping data from a CSV file `filename` and convert into a list of
-    evidence lists and a list of labels. Return a tuple (evidence, labels).
+    Load shopping data from a CSV file `filename` and convert into an array
+    of evidence and an array of labels. Return a tuple (evidence, labels).
 
-    evidence should be a list of lists, where each list contains the
-    following values, in order:
+    evidence is a float64 NumPy array with a row per data point. Each field
+    is parsed with its own type, so the integer fields below hold exact
+    integer values stored as floats. The row contains the following
+    values, in order:
         - Administrative, an integer
         - Administrative_Duration, a floating point number
         - Informational, an integer
@@ -56,54 +119,241 @@ def load_data(filename):
         - VisitorType, an integer 0 (not returning) or 1 (returning)
         - Weekend, an integer 0 (if false) or 1 (if true)
 
-    labels should be the corresponding list of labels, where each label
+    labels is the corresponding int8 array of labels, where each label
     is 1 if Revenue is true, and 0 otherwise.
+
+    Unless `cache` is False, the arrays are also saved
+    next to `filename` in a file named after a hash of its contents and
+    `CACHE_VERSION`, and loaded from there while the file is unchanged.
+    Hashing still reads the whole file on every call, so pass cache=False
+    for files only loaded once. If the cache cannot be written, the arrays
+    are returned all the same.
+    """
+    if cache:
+        cached = f"{filename}.{file_hash(filename)[:16]}.v{CACHE_VERSION}.npz"
+        if os.path.exists(cached):
+            with np.load(cached) as data:
+                return data["evidence"], data["labels"]
+
+    # Counts the rows first, so the arrays can be allocated once
+    rows = count_rows(filename)
+    evidence = np.empty((rows, len(EVIDENCE)))
+    labels = np.empty(rows, dtype=np.int8)
+
+    # Parses the file a chunk of lines at a time straight into a column of the right type for each field
+    with open(filename, newline="") as file:
+        header = next(csv.reader([file.readline()]))
+        fields = EVIDENCE + [("Revenue", "category")]
+        columns = [header.index(name) for name, _ in fields]
+        dtype = np.dtype([
+            (name, CATEGORY if kind == "category" else kind)
+            for name, kind in sorted(fields, key=lambda field: header.index(field[0]))
+        ])
+        start = 0
+        while True:
+            lines = list(itertools.islice(file, CHUNK_ROWS))
+            if not lines:
+                break
+            chunk = np.loadtxt(
+                lines, delimiter=",", quotechar='"', dtype=dtype,
+                usecols=sorted(columns), ndmin=1
+            )
+            end = start + len(chunk)
+            for k, (name, kind) in enumerate(EVIDENCE):
+                if kind == "category":
+                    evidence[start:end, k] = encode(name, chunk[name])
+                else:
+                    evidence[start:end, k] = chunk[name]
+            labels[start:end] = encode("Revenue", chunk["Revenue"])
+            start = end
+
+    # Caching is only an optimization, so a read-only directory or a full disk is not an error
+    if cache:
+        try:
+            with open(cached + ".tmp", "wb") as f:
+                np.savez(f, evidence=evidence[:start], labels=labels[:start])
+            os.replace(cached + ".tmp", cached)
+        except OSError:
+            try:
+                os.remove(cached + ".tmp")
+            except OSError:
+                pass
+
+    return (evidence[:start], labels[:start])
+
+
+def file_hash(filename):
+    """Return the SHA-256 hex digest of the contents of `filename`."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_rows(filename):
+    """
+    Return an upper bound on the number of data rows in the CSV file
+    `filename`: its number of lines, less the header.
+    """
+    lines = 0
+    last = b"\n"
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+
+    # Counts a last line without a newline at the end
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def encode(name, values):
     """
-    # Creates the lists to store the labels and evidence of all the training data
-    evidence_list = []
-    label_list = []
-
-    # Loads the file as a dictionary to easily read from it
-    with open(filename) as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            evidence = []
-            evidence.append(int(row['Administrative']))
-            evidence.append(float(row['Administrative_Duration']))
-            evidence.append(int(row['Informational']))
-            evidence.append(float(row['Informational_Duration']))
-            evidence.append(int(row['ProductRelated']))
-            evidence.append(float(row['ProductRelated_Duration']))
-            evidence.append(float(row['BounceRates']))
-            evidence.append(float(row['ExitRates']))
-            evidence.append(float(row['PageValues']))
-            evidence.append(float(row['SpecialDay']))
-            # Creates a list used tofind the index of each month whithout the need for if-elif-else statements
-            months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'June', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'] 
-            evidence.append(months.index(row['Month']))
-            evidence.append(int(row['OperatingSystems']))
-            evidence.append(int(row['Browser']))
-            evidence.append(int(row['Region']))
-            evidence.append(int(row['TrafficType']))
-            evidence.append(1 if row['VisitorType'] == 'Returning_Visitor' else 0)
-            evidence.append(1 if row['Weekend'] == 'TRUE' else 0)
-
-            # Adds the the evidence and label for the current data point to their respective list of values for all the data points
-            evidence_list.append(evidence)
-            label_list.append(1 if row['Revenue'] == 'TRUE' else 0)
-
-    return (evidence_list, label_list)
-
-
-def train_model(evidence, labels):
+    Return an array of the codes of the array of categorical `values` of
+    the column `name` (see `ENCODINGS`). Each distinct value is only encoded
+    once, and its code is remembered for later chunks.
+    """
+    codes = CODES.setdefault(name, dict())
+    distinct, inverse = np.unique(values, return_inverse=True)
+    for value in distinct.tolist():
+        if value not in codes:
+            codes[value] = ENCODINGS[name](value)
+    return np.array([codes[value] for value in distinct.tolist()], dtype=np.int8)[inverse]
+
+
+def train_model(evidence, labels, backend="brute"):
     """
     Given a list of evidence lists and a list of labels, return a
     fitted k-nearest neighbor model (k=1) trained on the data.
+
+    `backend` is one of `BACKENDS`: "brute" compares every pair of raw
+    feature vectors, "kd_tree" and "ball_tree" search a tree over the
+    standardized features, and "approximate" fits an
+    `ApproximateNeighbors` index that can be saved and loaded.
     """
-    # Creates a model based on the nearest-neighbour classifier and returns it fitted
-    model = KNeighborsClassifier(1)
+    if backend == "brute":
+        model = KNeighborsClassifier(1)
+    elif backend in ("kd_tree", "ball_tree"):
+        model = make_pipeline(StandardScaler(), KNeighborsClassifier(1, algorithm=backend))
+    elif backend == "approximate":
+        model = ApproximateNeighbors()
+    else:
+        raise ValueError(f"Unknown backend {backend}")
     return model.fit(evidence, labels)
-    
+
+
+def predict(model, evidence, workers=None):
+    """
+    Return the labels `model` predicts for the rows of `evidence`,
+    classifying chunks of `PREDICT_CHUNK` rows in a pool of `workers`
+    threads. Neighbor searches release the GIL, so chunks run in parallel.
+    """
+    evidence = np.asarray(evidence)
+    chunks = [
+        evidence[start:start + PREDICT_CHUNK]
+        for start in range(0, len(evidence), PREDICT_CHUNK)
+    ]
+    if len(chunks) <= 1:
+        return model.predict(evidence)
+    with ThreadPoolExecutor(workers) as executor:
+        return np.concatenate(list(executor.map(model.predict, chunks)))
+
+
+class ApproximateNeighbors():
+
+    def __init__(self, clusters=None, probes=PROBES, seed=0):
+        """
+        Create an approximate 1-nearest-neighbor classifier.
+
+        Training points are standardized and grouped into `clusters`
+        clusters by k-means (by default about the square root of their
+        number). A query is only compared with the points of the `probes`
+        clusters whose centers are nearest to it.
+        """
+        self.clusters = clusters
+        self.probes = probes
+        self.seed = seed
+
+    def fit(self, evidence, labels):
+        """
+        Index the rows of `evidence` with their `labels`, and return self.
+        """
+        evidence = np.asarray(evidence, dtype=float)
+        self.mean = evidence.mean(axis=0)
+        self.scale = evidence.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        points = (evidence - self.mean) / self.scale
+
+        clusters = self.clusters or max(1, int(np.sqrt(len(points))))
+        kmeans = MiniBatchKMeans(clusters, random_state=self.seed, n_init=3).fit(points)
+        self.centers = kmeans.cluster_centers_
+
+        # Stores the points grouped by cluster, the points of cluster c being offsets[c]:offsets[c + 1]
+        order = np.argsort(kmeans.labels_, kind="stable")
+        self.points = points[order]
+        self.labels = np.asarray(labels)[order]
+        self.offsets = np.searchsorted(kmeans.labels_[order], np.arange(len(self.centers) + 1))
+        return self
+
+    def predict(self, evidence):
+        """
+        Return the label of the nearest indexed point found for each row
+        of `evidence`.
+        """
+        queries = (np.asarray(evidence, dtype=float) - self.mean) / self.scale
+        probes = min(self.probes, len(self.centers))
+        nearest = np.argpartition(squared_distances(queries, self.centers), probes - 1, axis=1)[:, :probes]
+
+        # Compares each cluster's points with all the queries probing it at once
+        best = np.full(len(queries), np.inf)
+        labels = np.zeros(len(queries), dtype=self.labels.dtype)
+        for cluster in range(len(self.centers)):
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            rows = np.flatnonzero((nearest == cluster).any(axis=1))
+            if start == end or not len(rows):
+                continue
+            distances = squared_distances(queries[rows], self.points[start:end])
+            closest = distances.argmin(axis=1)
+            distance = distances[np.arange(len(rows)), closest]
+            better = distance < best[rows]
+            best[rows[better]] = distance[better]
+            labels[rows[better]] = self.labels[start + closest[better]]
+        return labels
+
+    def save(self, filename):
+        """
+        Save the fitted index to `filename` as a NumPy archive.
+        """
+        with open(filename, "wb") as f:
+            np.savez(
+                f, mean=self.mean, scale=self.scale, centers=self.centers,
+                points=self.points, labels=self.labels, offsets=self.offsets,
+                probes=self.probes, seed=self.seed
+            )
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the index saved in `filename` by `save`.
+        """
+        with np.load(filename) as data:
+            model = cls(probes=int(data["probes"]), seed=int(data["seed"]))
+            for name in ("mean", "scale", "centers", "points", "labels", "offsets"):
+                setattr(model, name, data[name])
+        model.clusters = len(model.centers)
+        return model
+
+
+def squared_distances(a, b):
+    """
+    Return the matrix of squared Euclidean distances between the rows
+    of `a` and the rows of `b`.
+    """
+    distances = (a * a).sum(axis=1)[:, None] - 2 * a @ b.T + (b * b).sum(axis=1)[None, :]
+    return np.maximum(distances, 0)
+
 
 def evaluate(labels, predictions):
     """